@@ -0,0 +1,332 @@
+# File: adldap_broker.py
+#
+# Copyright (c) 2021-2025 Splunk Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# Optional connection broker: a small daemon started by the connector that
+# keeps bound LDAP connections warm between action runs.
+import json
+import os
+import queue
+import ssl
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from types import SimpleNamespace
+
+import ldap3
+from ldap3.core import exceptions as ldap_exceptions
+from ldap3.extend import ExtendedOperationsRoot
+from ldap3.utils.conv import format_json
+
+from adldap_consts import *
+from adldap_tls import CachedTls
+
+
+# the only connection methods a client may run on a pooled connection
+BROKER_METHODS = ("search", "modify", "modify_dn", "add", "delete", "compare", "extended")
+
+
+def dump_exception(e):
+    """
+    returns a picklable description of an (ldap3) exception,
+    see load_exception.
+    """
+    return {
+        "type": type(e).__name__,
+        "message": e.message if isinstance(e, ldap_exceptions.LDAPOperationResult) else str(e),
+        "result": getattr(e, "result", None),
+        "description": getattr(e, "description", None),
+        "dn": getattr(e, "dn", None),
+        "response_type": getattr(e, "type", None),
+    }
+
+
+def load_exception(value):
+    """
+    rebuilds an exception described by dump_exception, keeping
+    the ldap3 exception class so callers can still tell transient
+    errors apart.
+    """
+    cls = getattr(ldap_exceptions, value["type"], None)
+    if isinstance(cls, type) and issubclass(cls, ldap_exceptions.LDAPOperationResult):
+        return cls(
+            result=value["result"],
+            description=value["description"],
+            dn=value["dn"],
+            message=value["message"],
+            response_type=value["response_type"],
+        )
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        return cls(value["message"])
+    return Exception(value["message"])
+
+
+class BrokerConnection:
+    """
+    Stands in for a bound ldap3 Connection and runs every LDAP
+    call on a pooled connection of the broker. It has the
+    attributes the ldap3 extended operations (paged search,
+    DirSync, password modify) use, so they work on it unchanged.
+
+    The connector attaches the ldap3 Server describing the
+    broker's domain controller as server after connecting.
+    """
+
+    def __init__(self, address, authkey, want_metadata=False):
+        self._client = Client(address, family="AF_UNIX", authkey=authkey)
+        self._client.send(want_metadata)
+        status, value = self._client.recv()
+        if status == "error":
+            self._client.close()
+            raise load_exception(value)
+
+        self.host = value["host"]
+        self.info = value.get("info")
+        self.schema = value.get("schema")
+        self.server = None
+        self.strategy = SimpleNamespace(sync=True, thread_safe=False)
+        self.check_names = True
+        self.auto_referrals = False
+        self.raise_exceptions = True
+        self.empty_attributes = True
+        self.bound = True
+        self.closed = False
+        self.response = None
+        self.result = None
+        self.last_error = None
+        self.extend = ExtendedOperationsRoot(self)
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            self._client.send((method, args, kwargs))
+            status, value = self._client.recv()
+        except (OSError, EOFError) as e:
+            self.bound = False
+            self.closed = True
+            raise ldap_exceptions.LDAPCommunicationError(f"Lost the connection to the connection broker: {e!s}")
+
+        if status == "error":
+            error, self.result = value
+            self.response = None
+            self.last_error = error["message"]
+            raise load_exception(error)
+
+        ret, self.result, self.response = value
+        return ret
+
+    def search(self, *args, **kwargs):
+        # pooled connections are shared between clients, so the setting goes along with every search
+        return self._call("search", *args, empty_attributes=self.empty_attributes, **kwargs)
+
+    def modify(self, *args, **kwargs):
+        return self._call("modify", *args, **kwargs)
+
+    def modify_dn(self, *args, **kwargs):
+        return self._call("modify_dn", *args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._call("add", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call("delete", *args, **kwargs)
+
+    def extended(self, *args, **kwargs):
+        return self._call("extended", *args, **kwargs)
+
+    def response_to_json(self):
+        if not isinstance(self.response, list):
+            return None
+        entries = [{"dn": r["dn"], "attributes": dict(r["attributes"])} for r in self.response if r["type"] == "searchResEntry"]
+        return json.dumps({"entries": entries}, sort_keys=True, indent=4, default=format_json)
+
+    def unbind(self):
+        # hands the pooled connection back to the broker
+        if not self.closed:
+            self._client.close()
+        self.bound = False
+        self.closed = True
+        return True
+
+
+class AdLdapBroker:
+    """
+    Keeps a pool of bound connections to the domain controllers
+    of one asset and runs the LDAP calls of connector processes on
+    them, so an action run does not pay the TCP/TLS handshake,
+    bind and schema download itself.
+
+    Each client gets a connection of its own for as long as it is
+    connected. Idle connections are checked before being handed out
+    again and replaced if the check fails. The broker exits once
+    it has had no clients for BROKER_IDLE_TIMEOUT seconds.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self._pool = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._clients = 0
+        self._last_activity = time.time()
+        self._metadata = {}
+        # shared by all pooled connections, so new ones resume the TLS session
+        if config["validate_ssl_cert"]:
+            self._tls = CachedTls(ca_certs_file=config["ca_certs_file"], validate=ssl.CERT_REQUIRED)
+        else:
+            self._tls = CachedTls(validate=ssl.CERT_NONE)
+
+    def _connect(self):
+        config = self._config
+        servers = [
+            ldap3.Server(
+                host, use_ssl=config["ssl"], port=config["port"], get_info=ldap3.ALL, tls=self._tls, connect_timeout=config["connect_timeout"]
+            )
+            for host in config["hosts"]
+        ]
+        server = servers[0] if len(servers) == 1 else ldap3.ServerPool(servers, ldap3.FIRST, active=1, exhaust=False)
+        connection = ldap3.Connection(
+            server,
+            user=config["username"],
+            password=config["password"],
+            raise_exceptions=True,
+            receive_timeout=config["receive_timeout"],
+            auto_range=False,
+        )
+        connection.open(read_server_info=False)
+        if config["starttls"]:
+            connection.start_tls(read_server_info=False)
+        connection.bind()
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.unbind()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        """
+        returns a bound (connection, last checked) pair, reusing
+        a pooled connection if one is idle and still healthy.
+        """
+        while True:
+            try:
+                connection, checked = self._pool.get_nowait()
+            except queue.Empty:
+                return self._connect(), time.time()
+
+            if connection.closed or not connection.bound:
+                self._discard(connection)
+                continue
+            if time.time() - checked < BROKER_HEALTH_CHECK_INTERVAL:
+                return connection, checked
+
+            try:
+                connection.search("", "(objectclass=*)", search_scope=ldap3.BASE, attributes=["currentTime"])
+                return connection, time.time()
+            except Exception:
+                self._discard(connection)
+
+    def _checkin(self, connection, checked):
+        if connection.closed or not connection.bound or self._pool.qsize() >= self._config["pool_size"]:
+            self._discard(connection)
+        else:
+            self._pool.put((connection, checked))
+
+    def _describe(self, connection, want_metadata):
+        server = connection.server
+        description = {"host": server.host}
+        if want_metadata and server.info and server.schema:
+            # the schema is large, serialize it once per host
+            if server.host not in self._metadata:
+                self._metadata[server.host] = {"info": server.info.to_json(indent=None), "schema": server.schema.to_json(indent=None)}
+            description.update(self._metadata[server.host])
+        return description
+
+    def _serve_client(self, client):
+        connection = None
+        checked = 0
+        with self._lock:
+            self._clients += 1
+        try:
+            want_metadata = client.recv()
+            try:
+                connection, checked = self._checkout()
+            except Exception as e:
+                client.send(("error", dump_exception(e)))
+                return
+            client.send(("ok", self._describe(connection, want_metadata)))
+
+            while True:
+                try:
+                    method, args, kwargs = client.recv()
+                except (OSError, EOFError):
+                    break
+
+                if method not in BROKER_METHODS:
+                    client.send(("error", (dump_exception(ValueError(f"Unsupported method: {method}")), None)))
+                    continue
+                try:
+                    if method == "search":
+                        connection.empty_attributes = kwargs.pop("empty_attributes", True)
+                    ret = getattr(connection, method)(*args, **kwargs)
+                    client.send(("ok", (ret, connection.result, connection.response)))
+                except Exception as e:
+                    if isinstance(e, ldap_exceptions.LDAPCommunicationError):
+                        self._discard(connection)
+                    client.send(("error", (dump_exception(e), connection.result)))
+                checked = time.time()
+        except (OSError, EOFError):
+            pass
+        finally:
+            client.close()
+            if connection is not None:
+                self._checkin(connection, checked)
+            with self._lock:
+                self._clients -= 1
+                self._last_activity = time.time()
+
+    def _exit_when_idle(self):
+        while True:
+            time.sleep(min(BROKER_IDLE_TIMEOUT, 30))
+            with self._lock:
+                idle = not self._clients and time.time() - self._last_activity > BROKER_IDLE_TIMEOUT
+            if idle:
+                while not self._pool.empty():
+                    self._discard(self._pool.get_nowait()[0])
+                os._exit(0)
+
+    def serve(self, address, authkey):
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        threading.Thread(target=self._exit_when_idle, daemon=True).start()
+        while True:
+            try:
+                client = listener.accept()
+            except Exception:
+                # failed authentication or a client that went away during the handshake
+                continue
+            with self._lock:
+                self._last_activity = time.time()
+            threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+
+
+def main():
+    # the config (including the password) is passed on stdin, never on the command line
+    config = json.load(sys.stdin)
+    AdLdapBroker(config).serve(config["address"], bytes.fromhex(config["authkey"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,26 +15,61 @@
 #
 #
 # Phantom App imports
+import base64
+import collections
+import contextlib
+import csv
+import fcntl
+import functools
+import gzip
+import hashlib
+import itertools
 import json
 import os
+import random
+import re
 import ssl
+import subprocess
 import sys
+import tempfile
+import time
+import uuid
+from multiprocessing import AuthenticationError
 
 # switched from python-ldap to ldap3 for this app. -gsh
 import ldap3
-import ldap3.extend.microsoft.addMembersToGroups
-import ldap3.extend.microsoft.removeMembersFromGroups
-import ldap3.extend.microsoft.unlockAccount
 import phantom.app as phantom
-from ldap3 import Tls
-from ldap3.utils.dn import parse_dn
+import phantom.rules as ph_rules
+from ldap3.core.exceptions import (
+    LDAPBusyResult,
+    LDAPCommunicationError,
+    LDAPInvalidDnError,
+    LDAPInvalidDNSyntaxResult,
+    LDAPNoSuchObjectResult,
+    LDAPResponseTimeoutError,
+    LDAPServerPoolExhaustedError,
+    LDAPTimeLimitExceededResult,
+    LDAPUnavailableResult,
+)
+from ldap3.core.results import RESULT_SUCCESS
+from ldap3.protocol.microsoft import show_deleted_control
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+from ldap3.utils.conv import escape_bytes, escape_filter_chars, format_json
+from ldap3.utils.dn import parse_dn, safe_dn, to_dn
 from phantom.action_result import ActionResult
 
 # import json
 from phantom.base_connector import BaseConnector
+from phantom.vault import Vault
 from phantom_common import paths
 
+from adldap_broker import BrokerConnection
 from adldap_consts import *
+from adldap_tls import CachedTls
+
+
+# errors worth retrying: the server or the network may recover on the next attempt
+TRANSIENT_LDAP_ERRORS = (LDAPBusyResult, LDAPCommunicationError, LDAPResponseTimeoutError, LDAPServerPoolExhaustedError, LDAPUnavailableResult)
 
 
 class RetVal(tuple):
@@ -42,16 +77,454 @@ class RetVal(tuple):
         return tuple.__new__(RetVal, (val1, val2))
 
 
+class QueryResultWriter:
+    """
+    Writes search entries to a gzip compressed JSONL or CSV file
+    as they arrive, keeping only the first few in memory as a
+    sample. It provides the list methods _paged_query uses, so it
+    can be passed in place of the entries list.
+
+    In JSONL mode the values of ranged attributes (e.g. the member
+    attribute of a large group) are written one range at a time as
+    they are fetched, so they are never held in memory whole. The
+    sample only keeps their first range.
+    """
+
+    def __init__(self, path, output_mode, columns, sample_size=EXPORT_SAMPLE_SIZE):
+        self.path = path
+        self.stream_ranges = output_mode == "jsonl"
+        self._output_mode = output_mode
+        self._columns = columns
+        self._sample_size = sample_size
+        self._file = None
+        self.clear()
+
+    def clear(self):
+        # (re)start the file, a retried search starts over from the first entry
+        self.close()
+        self._file = gzip.open(self.path, "wt", encoding="utf-8", newline="")
+        self._count = 0
+        self.sample = []
+        if self._output_mode == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=self._columns, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def append(self, entry):
+        # same lowercase attribute names as the inline run query data
+        ranges = {k.lower(): v for k, v in entry.get("ranges", {}).items()}
+        entry = {"attributes": {k.lower(): v for k, v in entry["attributes"].items()}, "dn": entry["dn"]}
+        sample = None
+        if len(self.sample) < self._sample_size:
+            sample = {"attributes": dict(entry["attributes"]), "dn": entry["dn"]}
+            self.sample.append(sample)
+
+        if ranges:
+            self._write_ranges(entry, ranges, sample)
+        elif self._output_mode == "csv":
+            row = {k: v if isinstance(v, str) else json.dumps(v) for k, v in entry["attributes"].items()}
+            row["dn"] = entry["dn"]
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._count += 1
+
+    def _write_ranges(self, entry, ranges, sample):
+        # writes the same JSON line as json.dumps would, with the ranged values written as they arrive
+        attributes = entry["attributes"]
+        self._file.write('{"attributes":{')
+        for n, key in enumerate(sorted({*attributes, *ranges})):
+            self._file.write("{}{}:".format("," if n else "", json.dumps(key)))
+            if key not in ranges:
+                self._file.write(json.dumps(attributes[key], separators=(",", ":")))
+                continue
+
+            self._file.write("[")
+            written = False
+            values = []
+            for chunk in ranges[key]:
+                if chunk:
+                    self._file.write(("," if written else "") + json.dumps(chunk, separators=(",", ":"))[1:-1])
+                    written = True
+                if sample is not None:
+                    values.extend(chunk)
+            self._file.write("]")
+            if sample is not None:
+                # replaces the empty placeholder of the ranged attribute, so the sample matches the line
+                sample["attributes"][key] = values
+        self._file.write('},"dn":' + json.dumps(entry["dn"]) + "}\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self._count
+
+
+class PhaseTimings:
+    """
+    Collects the count, duration and LDAP bytes of each phase of
+    an action run (bind, root_dn, sam_to_dn, query, modify, ...).
+    Phases may nest, so the duration of a phase includes the
+    phases it runs.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, phase, duration, count=1, size=0):
+        timing = self.phases.setdefault(phase, {"count": 0, "duration": 0.0, "bytes": 0})
+        timing["count"] += count
+        timing["duration"] += duration
+        timing["bytes"] += size
+
+    @contextlib.contextmanager
+    def measure(self, phase, get_bytes, count=1):
+        start = time.time()
+        start_bytes = get_bytes()
+        try:
+            yield
+        finally:
+            # a reconnect replaces the connection and its counters
+            self.add(phase, time.time() - start, count, max(get_bytes() - start_bytes, 0))
+
+    def to_dict(self):
+        return {phase: dict(timing, duration=round(timing["duration"], 4)) for phase, timing in self.phases.items()}
+
+
+def timed(phase):
+    """
+    records every call of the decorated connector method as
+    one occurrence of phase in the timings of the action run.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._measure(phase):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 class AdLdapConnector(BaseConnector):
     def __init__(self):
         super().__init__()
 
     def replace_null_values(self, data):
-        return json.loads(json.dumps(data).replace("\\u0000", "\\\\u0000"))
+        """
+        Escapes NUL characters as a literal "\\u0000" in every string
+        of data. Lists and dicts are updated in place in a single
+        pass, and only strings that contain a NUL are replaced.
+        """
+        if isinstance(data, str):
+            return data.replace("\x00", "\\u0000") if "\x00" in data else data
+
+        if isinstance(data, list):
+            for i, value in enumerate(data):
+                new_value = self.replace_null_values(value)
+                if new_value is not value:
+                    data[i] = new_value
+        elif isinstance(data, dict):
+            for key in [k for k in data if isinstance(k, str) and "\x00" in k]:
+                data[self.replace_null_values(key)] = data.pop(key)
+            for key, value in data.items():
+                new_value = self.replace_null_values(value)
+                if new_value is not value:
+                    data[key] = new_value
+
+        return data
 
     def _dump_error_log(self, error, message="Exception occurred."):
         self.error_print(message, dump_object=error)
 
+    def _validate_integer(self, action_result, parameter, key, allow_zero=False):
+        """
+        returns (phantom.APP_SUCCESS, int) if the parameter is a valid
+        integer, else (phantom.APP_ERROR, None).
+        """
+        if parameter is not None:
+            try:
+                if not float(parameter).is_integer():
+                    return action_result.set_status(phantom.APP_ERROR, ADLDAP_VALID_INT_MSG.format(param=key)), None
+                parameter = int(parameter)
+            except Exception:
+                return action_result.set_status(phantom.APP_ERROR, ADLDAP_VALID_INT_MSG.format(param=key)), None
+
+            if parameter < 0:
+                return action_result.set_status(phantom.APP_ERROR, ADLDAP_NON_NEG_INT_MSG.format(param=key)), None
+            if not allow_zero and parameter == 0:
+                return action_result.set_status(phantom.APP_ERROR, ADLDAP_NON_NEG_NON_ZERO_INT_MSG.format(param=key)), None
+
+        return phantom.APP_SUCCESS, parameter
+
+    def _get_error_message(self, e):
+        """
+        returns the message to report for an exception, making
+        timeouts explicit so they are easy to tell apart from
+        other failures in the action result.
+        """
+        if isinstance(e, (LDAPResponseTimeoutError, LDAPTimeLimitExceededResult)) or "timed out" in str(e):
+            return ADLDAP_TIMEOUT_ERR_MSG.format(error=e)
+        return str(e)
+
+    def _get_retry_delay(self, attempt):
+        # exponential backoff with full jitter, so parallel runs do not retry in lockstep
+        return random.uniform(0, RETRY_BACKOFF_BASE * 2**attempt)
+
+    @timed("bind")
+    def _connect(self):
+        """
+        builds the server (or server pool) and the connection
+        and binds. Returns the result of the bind, raises on
+        connection errors.
+        """
+        server_param = {
+            "use_ssl": self._ssl,
+            "port": self._ssl_port,
+            "get_info": ldap3.ALL,
+            "tls": self._get_tls(),
+            "connect_timeout": self._connect_timeout,
+        }
+
+        if self._use_connection_broker:
+            start = time.time()
+            connection = self._get_broker_connection(want_metadata=not all(self._get_cached_metadata(host) for host in self._servers))
+            if connection is not None:
+                self._ldap_server = ldap3.Server(**dict(server_param, host=connection.host, get_info=ldap3.NONE))
+                if not self._attach_cached_metadata(self._ldap_server) and connection.info and connection.schema:
+                    self._ldap_server.attach_dsa_info(DsaInfo.from_json(connection.info))
+                    self._ldap_server.attach_schema_info(SchemaInfo.from_json(connection.schema))
+                    self._cache_metadata(connection.host)
+                connection.server = self._ldap_server
+                self._ldap_connection = connection
+                self._record_server_health(connection.host, latency=time.time() - start)
+                return True
+
+        hosts = self._get_ordered_servers()
+        servers = []
+        for host in hosts:
+            server = ldap3.Server(**dict(server_param, host=host))
+            # skip the DSE and schema download if we have a fresh copy in the state file
+            if self._attach_cached_metadata(server):
+                server.get_info = ldap3.NONE
+            servers.append(server)
+
+        if len(servers) == 1:
+            self._ldap_server = servers[0]
+        else:
+            # the hosts are already ordered by the configured strategy, so the
+            # pool only has to fail over to the next available one
+            self._ldap_server = ldap3.ServerPool(servers, ldap3.FIRST, active=1, exhaust=False)
+        self.save_progress(f"configured server {self._server}...")
+        # ranged attributes are expanded by _expand_ranged_attributes, the
+        # ldap3 auto range search has no value cap and clobbers the paged search
+        self._ldap_connection = ldap3.Connection(
+            self._ldap_server,
+            user=self._username,
+            password=self._password,
+            raise_exceptions=True,
+            receive_timeout=self._receive_timeout,
+            auto_range=False,
+            collect_usage=True,
+        )
+        self.save_progress("binding to directory...")
+
+        start = time.time()
+        handshake_time = self._tls.handshake_time
+        resumed = self._tls.resumed
+        try:
+            self._open_connection(self._ldap_connection)
+            connected = time.time()
+            bound = self._ldap_connection.bind()
+        except (LDAPCommunicationError, LDAPServerPoolExhaustedError):
+            for host in hosts:
+                self._record_server_health(host)
+            raise
+
+        handshake_time = self._tls.handshake_time - handshake_time
+        self._connect_timings = {
+            "connect": round(connected - start - handshake_time, 4),
+            "tls_handshake": round(handshake_time, 4),
+            "tls_session_resumed": self._tls.resumed > resumed,
+            "bind": round(time.time() - connected, 4),
+        }
+        self.debug_print(f"ldap_bind, timings = {self._connect_timings}")
+        if self._ssl or self._use_starttls:
+            self._timings.add("tls_handshake", handshake_time)
+
+        # every host ahead of the one the pool picked was unavailable
+        selected = next((i for i, server in enumerate(servers) if server is self._ldap_connection.server), 0)
+        for host in hosts[:selected]:
+            self._record_server_health(host)
+        self._record_server_health(hosts[selected], latency=time.time() - start)
+        self._ldap_server = servers[selected]
+
+        if bound and self._ldap_server.get_info != ldap3.NONE:
+            self._cache_metadata(hosts[selected])
+
+        return bound
+
+    def _attach_cached_metadata(self, server):
+        """
+        attaches the cached root DSE and schema of the server's
+        host to it. Returns True if there was a usable copy.
+        """
+        metadata = self._get_cached_metadata(server.host)
+        if not metadata:
+            return False
+
+        try:
+            dsa_info = DsaInfo.from_json(metadata["info"])
+            schema_info = SchemaInfo.from_json(metadata["schema"])
+        except Exception as e:
+            self.debug_print(f"ldap_bind, discarding cached server metadata of {server.host}: {e!s}")
+            return False
+
+        server.attach_dsa_info(dsa_info)
+        server.attach_schema_info(schema_info)
+        return True
+
+    def _get_ldap_bytes(self):
+        # bytes sent and received so far by the connections of this run
+        total = 0
+        for connection in (self._ldap_connection, self._ldap_async_connection):
+            usage = getattr(connection, "usage", None)
+            if usage is not None:
+                total += usage.bytes_transmitted + usage.bytes_received
+        return total
+
+    def _measure(self, phase, count=1):
+        """
+        returns a context manager recording the block as count
+        occurrences of phase in the timings of the action run.
+        """
+        return self._timings.measure(phase, self._get_ldap_bytes, count)
+
+    def _report_timings(self, action_id, ret_val, duration):
+        """
+        logs the timings of the action run as a JSON line and,
+        if collect_timings is enabled, adds them to the summary
+        and appends the line to the timings log in the state dir.
+        """
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "asset_id": self.get_asset_id(),
+            "action": action_id,
+            "success": bool(phantom.is_success(ret_val)),
+            "duration": round(duration, 4),
+            "phases": self._timings.to_dict(),
+        }
+        line = json.dumps(record, sort_keys=True)
+        self.debug_print(f"timings = {line}")
+        if not self._collect_timings:
+            return
+
+        action_results = self.get_action_results()
+        if action_results:
+            action_results[-1].update_summary({"timings": {"duration": record["duration"], "phases": record["phases"]}})
+
+        path = os.path.join(self.get_state_dir(), f"{self.get_asset_id()}_{TIMINGS_LOG_FILE}")
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > TIMINGS_LOG_MAX_SIZE:
+                os.replace(path, f"{path}.1")
+            with open(path, "a") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            self.debug_print(f"_report_timings, unable to write the timings log: {e!s}")
+
+    def _get_tls(self):
+        """
+        returns the Tls of this process. It is built once, so
+        reconnects and the pipelined connection reuse its SSL
+        context and can resume the TLS session of the first bind.
+        """
+        if self._tls is None:
+            if self._validate_ssl_cert:
+                self._tls = CachedTls(ca_certs_file=paths.CA_CERTS_PEM, validate=ssl.CERT_REQUIRED)
+            else:
+                self._tls = CachedTls(validate=ssl.CERT_NONE)
+        return self._tls
+
+    def _open_connection(self, connection):
+        """
+        opens the socket of connection and, if configured, upgrades
+        it with StartTLS so the bind is never sent in the clear.
+        """
+        connection.open(read_server_info=False)
+        if self._use_starttls:
+            connection.start_tls(read_server_info=False)
+
+    def _get_broker_address(self):
+        """
+        returns the (address, authkey, config) of the connection
+        broker for this asset. The address does not depend on the
+        password, the authkey does, so a broker started with an old
+        password turns clients away and exits once idle.
+        """
+        config = {
+            "asset_id": self.get_asset_id(),
+            "hosts": self._servers,
+            "port": self._ssl_port,
+            "ssl": self._ssl,
+            "starttls": self._use_starttls,
+            "validate_ssl_cert": self._validate_ssl_cert,
+            "ca_certs_file": paths.CA_CERTS_PEM,
+            "username": self._username,
+            "connect_timeout": self._connect_timeout,
+            "receive_timeout": self._receive_timeout,
+            "pool_size": BROKER_POOL_SIZE,
+        }
+        address = f"\0adldap_broker_{hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:32]}"
+        config["password"] = self._password
+        authkey = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).digest()
+        return address, authkey, config
+
+    def _get_broker_connection(self, want_metadata=False):
+        """
+        returns a BrokerConnection from the asset's connection
+        broker, starting the broker if it is not running yet, or
+        None if it cannot be used (the caller then binds directly).
+        LDAP errors of the broker's bind are raised as usual.
+        """
+        address, authkey, config = self._get_broker_address()
+        try:
+            return BrokerConnection(address, authkey, want_metadata)
+        except AuthenticationError:
+            self.debug_print("connection broker rejected the credentials, binding directly")
+            return None
+        except OSError:
+            pass
+
+        self.save_progress("starting connection broker...")
+        try:
+            broker = subprocess.Popen(
+                [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "adldap_broker.py")],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+                start_new_session=True,
+            )
+            broker.stdin.write(json.dumps(dict(config, address=address, authkey=authkey.hex())).encode())
+            broker.stdin.close()
+        except Exception as e:
+            self.debug_print(f"unable to start the connection broker, binding directly: {e!s}")
+            return None
+
+        deadline = time.time() + BROKER_START_TIMEOUT
+        while time.time() < deadline:
+            try:
+                return BrokerConnection(address, authkey, want_metadata)
+            except OSError:
+                time.sleep(0.1)
+
+        self.debug_print("connection broker did not come up, binding directly")
+        return None
+
     def _ldap_bind(self, action_result=None):
         """
         returns phantom.APP_SUCCESS if connection succeeded,
@@ -60,48 +533,146 @@ class AdLdapConnector(BaseConnector):
         If an action_result is passed in, method will
         appropriately use it. Otherwise just return
         APP_SUCCESS/APP_ERROR
+
+        Transient errors (server down, busy, timeouts) are
+        retried up to max_retries times with jittered backoff.
         """
         if self._ldap_connection and self._ldap_connection.bound and not self._ldap_connection.closed:
             return True
         elif self._ldap_connection is not None:
             self._ldap_connection.unbind()
 
-        try:
-            if self._validate_ssl_cert:
-                tls = Tls(ca_certs_file=paths.CA_CERTS_PEM, validate=ssl.CERT_REQUIRED)
-            else:
-                tls = Tls(validate=ssl.CERT_NONE)
-
-            server_param = {"use_ssl": self._ssl, "port": self._ssl_port, "host": self._server, "get_info": ldap3.ALL, "tls": tls}
-
-            self._ldap_server = ldap3.Server(**server_param)
-            self.save_progress(f"configured server {self._server}...")
-            self._ldap_connection = ldap3.Connection(self._ldap_server, user=self._username, password=self._password, raise_exceptions=True)
-            self.save_progress("binding to directory...")
-
-            if not self._ldap_connection.bind():
+        attempt = 0
+        while True:
+            try:
+                bound = self._connect()
+                break
+            except Exception as e:
+                if isinstance(e, TRANSIENT_LDAP_ERRORS) and attempt < self._max_retries:
+                    delay = self._get_retry_delay(attempt)
+                    attempt += 1
+                    self.debug_print(f"ldap_bind, transient error: {e!s}, retry {attempt} of {self._max_retries} in {delay:.2f}s")
+                    time.sleep(delay)
+                    continue
+
+                self.debug_print(f"ldap_bind, e = {e!s}")
+                self._dump_error_log(e)
                 if action_result:
-                    return action_result.set_status(phantom.APP_ERROR, self._ldap_connection.result["description"])
+                    return action_result.set_status(phantom.APP_ERROR, self._get_error_message(e))
                 else:
                     return phantom.APP_ERROR
 
+        if not bound:
             if action_result:
-                return action_result.set_status(phantom.APP_SUCCESS)
+                return action_result.set_status(phantom.APP_ERROR, self._ldap_connection.result["description"])
             else:
-                return phantom.APP_SUCCESS
+                return phantom.APP_ERROR
+
+        if action_result:
+            return action_result.set_status(phantom.APP_SUCCESS)
+        else:
+            return phantom.APP_SUCCESS
+
+    def _get_ordered_servers(self):
+        """
+        returns the configured hosts in the order they should be
+        tried, based on the server pool strategy and the health
+        recorded in the state file by previous runs.
+        """
+        hosts = list(self._servers)
+        if len(hosts) == 1:
+            return hosts
+
+        if self._server_pool_strategy == "ROUND_ROBIN":
+            # each action run is a new process, so the rotation is kept in the state file
+            index = self._state.get("server_pool_index", 0) % len(hosts)
+            self._state["server_pool_index"] = index + 1
+            hosts = hosts[index:] + hosts[:index]
+        elif self._server_pool_strategy == "FASTEST":
+            # hosts that were never measured come first so they get a latency
+            hosts.sort(key=lambda host: self._server_health.get(host, {}).get("latency", 0))
+
+        # move hosts that failed recently to the end, so a dead DC is skipped right away
+        now = time.time()
+
+        def is_down(host):
+            health = self._server_health.get(host, {})
+            last_failure = health.get("last_failure", 0)
+            return last_failure > health.get("last_success", 0) and now - last_failure < SERVER_RETRY_INTERVAL
+
+        return sorted(hosts, key=is_down)
+
+    def _record_server_health(self, host, latency=None):
+        """
+        records a failed connection to host, or a successful
+        one with its bind latency (seconds) in the state file.
+        """
+        health = self._server_health.setdefault(host, {})
+        if latency is None:
+            health["last_failure"] = time.time()
+            return
+
+        health["last_success"] = time.time()
+        previous = health.get("latency")
+        # smooth the measurements so one slow bind does not reorder the pool
+        health["latency"] = round(latency if previous is None else 0.7 * previous + 0.3 * latency, 4)
+
+    def _get_metadata_cache_key(self, host):
+        return f"{host.lower()}:{self._ssl_port}"
 
+    def _get_cached_metadata(self, host):
+        """
+        returns the cached server metadata (dict) of host if it
+        is younger than the TTL, else None.
+        """
+        if not self._metadata_cache_ttl:
+            return None
+
+        metadata = self._state.get("metadata_cache", {}).get(self._get_metadata_cache_key(host))
+        if not metadata or time.time() - metadata.get("timestamp", 0) > self._metadata_cache_ttl:
+            return None
+
+        if not metadata.get("info") or not metadata.get("schema"):
+            return None
+
+        return metadata
+
+    def _cache_metadata(self, host):
+        """
+        stores defaultNamingContext, the supported controls and
+        the schema of the bound server, host, in the state file.
+        """
+        if not self._metadata_cache_ttl:
+            return
+
+        info = self._ldap_server.info
+        schema = self._ldap_server.schema
+        if not info or not schema:
+            return
+
+        try:
+            self._state.setdefault("metadata_cache", {})[self._get_metadata_cache_key(host)] = {
+                "timestamp": time.time(),
+                "default_naming_context": info.other["defaultNamingContext"][0],
+                "supported_controls": [control[0] for control in info.supported_controls],
+                "info": info.to_json(indent=None),
+                "schema": schema.to_json(indent=None),
+            }
         except Exception as e:
-            self.debug_print(f"ldap_bind, e = {e!s}")
-            self._dump_error_log(e)
-            if action_result:
-                return action_result.set_status(phantom.APP_ERROR, str(e))
-            else:
-                return phantom.APP_ERROR
+            self.debug_print(f"_cache_metadata, unable to cache server metadata: {e!s}")
 
+    @timed("root_dn")
     def _get_root_dn(self, action_result=None):
         """
         returns root dn (str) if found, else False.
         """
+        # the domain controllers of an asset serve the same domain, so any of them will do before a bind
+        bound = self._ldap_connection is not None and self._ldap_connection.bound
+        for host in [self._ldap_connection.server.host] if bound else self._servers:
+            metadata = self._get_cached_metadata(host)
+            if metadata:
+                return metadata["default_naming_context"]
+
         if self._ldap_bind():
             try:
                 return self._ldap_connection.server.info.other["defaultNamingContext"][0]
@@ -110,54 +681,466 @@ class AdLdapConnector(BaseConnector):
         else:
             return False
 
-    def _sam_to_dn(self, sam, action_result=None):
+    def _sam_cache_lookup(self, sam, now):
+        """
+        returns the cached distinguishedname (str), False for a
+        cached miss, or None if the samaccountname is not cached.
+        """
+        entry = self._sam_cache.get(sam)
+        if entry is None:
+            return None
+
+        dn, expires = entry
+        if expires < now:
+            del self._sam_cache[sam]
+            return None
+
+        # move the entry to the end so eviction drops the least recently used
+        self._sam_cache[sam] = self._sam_cache.pop(sam)
+        return dn
+
+    def _sam_cache_store(self, sam, dn, now):
+        ttl = self._sam_cache_ttl if dn else min(SAM_NEGATIVE_CACHE_TTL, self._sam_cache_ttl)
+        self._sam_cache.pop(sam, None)
+        self._sam_cache[sam] = [dn, now + ttl]
+        while len(self._sam_cache) > self._sam_cache_size:
+            del self._sam_cache[next(iter(self._sam_cache))]
+
+    def _sam_cache_invalidate(self, dn):
+        """
+        drops every cached samaccountname that resolves to the
+        given distinguishedname or to an object underneath it.
+        """
+        dn = dn.lower()
+        stale = [k for k, (v, _) in self._sam_cache.items() if v and (v.lower() == dn or v.lower().endswith("," + dn))]
+        for sam in stale:
+            del self._sam_cache[sam]
+
+    def _refresh_stale_dns(self, action_result, dns):
+        """
+        resolves the samaccountnames behind the given distinguishednames
+        again if they came from the cache, for DNs that turned out not
+        to exist (e.g. the object was moved or renamed outside of this
+        app), dropping the stale cache entries.
+
+        Returns a tuple of status and a dict of normalized old
+        distinguishedname -> new distinguishedname, or False if the
+        name is no longer found. DNs that did not come from the cache
+        are not included. A new DN is lowercased if the old one was,
+        like the _sam_to_dn result it came from.
+        """
+        stale = {}
+        lowercase = set()
+        for dn in dns:
+            name = self._sam_cache_hits.pop(self._normalize_dn(dn), None)
+            if name:
+                self._sam_cache.pop(name, None)
+                stale[self._normalize_dn(dn)] = name
+                if dn == dn.lower():
+                    lowercase.add(name)
+        if not stale:
+            return phantom.APP_SUCCESS, {}
+
+        self.debug_print(f"_refresh_stale_dns, cached distinguishednames no longer exist: {list(stale)}")
+        ret_val, user_dn = self._sam_to_dn(list(stale.values()), action_result=action_result, keep_case=True)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), {}
+
+        user_dn.update(self._lower_dns({name: user_dn.get(name, False) for name in lowercase}))
+        return phantom.APP_SUCCESS, {dn: user_dn.get(name, False) for dn, name in stale.items()}
+
+    def _refresh_stale_targets(self, action_result, targets, indexes):
+        """
+        see _refresh_stale_dns, for the targets at the given indexes.
+        Targets that are no longer found lose their "user_dn" key.
+        Returns a tuple of status and the indexes that got a new
+        distinguishedname.
+        """
+        ret_val, refreshed = self._refresh_stale_dns(action_result, [targets[i]["user_dn"] for i in indexes if "user_dn" in targets[i]])
+        if phantom.is_fail(ret_val) or not refreshed:
+            return ret_val, []
+
+        changed = []
+        for i in dict.fromkeys(indexes):
+            new_dn = refreshed.get(self._normalize_dn(targets[i].get("user_dn", "")))
+            if new_dn is None:
+                continue
+            if new_dn and self._normalize_dn(new_dn) != self._normalize_dn(targets[i]["user_dn"]):
+                targets[i]["user_dn"] = new_dn
+                changed.append(i)
+            elif not new_dn:
+                del targets[i]["user_dn"]
+
+        return phantom.APP_SUCCESS, changed
+
+    def _modify_with_retry(self, action_result, dn, modify):
+        """
+        returns a tuple of modify(dn)'s return value and the
+        distinguishedname it was called with. If dn came from the
+        cache and no longer exists, the name is resolved again and
+        modify is retried once with the new distinguishedname.
+        """
+        try:
+            with self._measure("modify"):
+                return modify(dn), dn
+        except LDAPNoSuchObjectResult:
+            ret_val, refreshed = self._refresh_stale_dns(action_result, [dn])
+            new_dn = refreshed.get(self._normalize_dn(dn))
+            if phantom.is_fail(ret_val) or not new_dn or self._normalize_dn(new_dn) == self._normalize_dn(dn):
+                raise
+
+        with self._measure("modify"):
+            return modify(new_dn), new_dn
+
+    def _get_query_cache_path(self):
+        return os.path.join(self.get_state_dir(), f"{self.get_asset_id()}_{QUERY_CACHE_FILE}")
+
+    def _read_query_cache(self):
+        """
+        returns the run query result cache file as a dict of
+        "entries" (cache key -> entry) and "invalidations", a list
+        of [normalized distinguishedname, time] of recent writes.
+        """
+        try:
+            with open(self._get_query_cache_path()) as f:
+                cache = json.load(f)
+            return {"entries": cache.get("entries") or {}, "invalidations": cache.get("invalidations") or []}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.debug_print(f"_read_query_cache, discarding the run query cache: {e!s}")
+        return {"entries": {}, "invalidations": []}
+
+    def _get_query_cache(self):
+        """
+        returns the run query result entries, loading them from
+        their file next to the state file on first use.
+        """
+        if self._query_cache is None:
+            self._query_cache = self._read_query_cache()["entries"]
+        return self._query_cache
+
+    def _save_query_cache(self):
+        """
+        merges what this run stored, read and invalidated into the
+        cache file. Other runs may have saved since it was loaded,
+        so the file is read again under an exclusive lock: entries
+        they dropped stay dropped, and an entry whose query started
+        before a write to its search base (by any run) is discarded.
+        Lookups alone never rewrite the file.
+        """
+        if not self._query_cache_stored and not self._query_cache_invalidations:
+            return
+
+        path = self._get_query_cache_path()
+        try:
+            with open(f"{path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                cache = self._read_query_cache()
+                now = time.time()
+
+                # a write older than the TTL cannot make an entry stale that has not expired yet
+                invalidations = [i for i in cache["invalidations"] + self._query_cache_invalidations if i[1] > now - self._query_cache_ttl]
+                entries = cache["entries"]
+                for key, entry in self._query_cache_stored.items():
+                    if entry["stored"] >= entries.get(key, {}).get("stored", 0):
+                        entries[key] = entry
+                for key, accessed in self._query_cache_accessed.items():
+                    if key in entries:
+                        entries[key]["accessed"] = max(entries[key].get("accessed", 0), accessed)
+
+                for key, entry in list(entries.items()):
+                    stored = entry.get("stored", 0)
+                    if entry["expires"] < now or any(t >= stored and self._is_below(entry["base"], dn) for dn, t in invalidations):
+                        del entries[key]
+
+                # least recently used first
+                total = sum(entry["size"] for entry in entries.values())
+                for key in sorted(entries, key=lambda k: entries[k].get("accessed", entries[k].get("stored", 0))):
+                    if total <= QUERY_CACHE_SIZE:
+                        break
+                    total -= entries.pop(key)["size"]
+
+                # write to a temporary file first so a concurrent run never reads half a cache
+                fd, tmp_path = tempfile.mkstemp(dir=self.get_state_dir(), suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"entries": entries, "invalidations": invalidations}, f, separators=(",", ":"))
+                os.replace(tmp_path, path)
+        except Exception as e:
+            self.debug_print(f"_save_query_cache, unable to save the run query cache: {e!s}")
+
+    def _get_query_cache_key(self, param, search_base, max_results, max_values):
+        """
+        returns the cache key of a run query: the filter without
+        insignificant whitespace and with lowercase attribute names,
+        the normalized search base, the sorted attributes and limits.
+        """
+        filter = re.sub(r"\)\s+(?=[()])", ")", param["filter"].strip())
+        filter = re.sub(r"\(\s*([&|!])\s*(?=\()", r"(\1", filter)
+        filter = re.sub(r"\(([\w.;-]+)(~=|>=|<=|:|=)", lambda m: f"({m.group(1).lower()}{m.group(2)}", filter)
+        attributes = sorted({i.strip().lower() for i in param["attributes"].split(";") if i.strip()})
+        key = [filter, self._normalize_dn(search_base), attributes, max_results, max_values]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def _query_cache_lookup(self, key, now):
+        """
+        returns the cached data of a run query, or None if it is
+        not cached or has expired.
+        """
+        entry = self._get_query_cache().get(key)
+        if entry is None or entry["expires"] < now:
+            return None
+
+        # only kept for eviction, a hit alone does not save the cache
+        self._query_cache_accessed[key] = now
+        return dict(entry["data"])
+
+    def _query_cache_store(self, key, search_base, data, now):
+        """
+        caches the data of a run query that started at now.
+        """
+        size = len(json.dumps(data, separators=(",", ":")))
+        if size > QUERY_CACHE_SIZE:
+            return
+
+        entry = {
+            "base": self._normalize_dn(search_base),
+            "stored": now,
+            "expires": now + self._query_cache_ttl,
+            "size": size,
+            "data": dict(data),
+        }
+        self._get_query_cache()[key] = self._query_cache_stored[key] = entry
+
+    def _is_below(self, base, dn):
+        """
+        returns True if a write to the normalized dn may change the
+        results of a search under the normalized base: dn is the
+        base, lies underneath it or contains it.
+        """
+        return dn == base or dn.endswith("," + base) or base.endswith("," + dn)
+
+    def _query_cache_invalidate(self, dns):
+        """
+        drops the cached results of every query whose search base
+        contains one of the given distinguishednames (or lies
+        underneath one), since writing to them may change which
+        entries match and what they hold. The writes are recorded
+        in the cache file too, see _save_query_cache.
+        """
+        cache = self._get_query_cache()
+        if not self._query_cache_ttl and not cache:
+            return
+
+        now = time.time()
+        dns = [self._normalize_dn(dn) for dn in dns]
+        self._query_cache_invalidations.extend([dn, now] for dn in dns)
+        for key in [key for key, entry in cache.items() if any(self._is_below(entry["base"], dn) for dn in dns)]:
+            del cache[key]
+            self._query_cache_stored.pop(key, None)
+
+    @timed("sam_to_dn")
+    def _sam_to_dn(self, sam, action_result=None, keep_case=False):
         """
         This method will take a list of samaccountnames
         and return a dictionary with the key as the
-        samaccountname and the value as the distinguishedname.
+        samaccountname and the value as the distinguishedname,
+        lowercased unless keep_case is set.
 
         If a corresponding distinguishedname was not found, then
         the key will be the samaccountname and the value will be
         False.
+
+        Results (including misses) are cached in the state file,
+        so only names without a fresh cache entry are searched for.
         """
 
-        # create a usable ldap filter
-        filter = "(|"
-        for users in sam:
-            filter = filter + f"(samaccountname={users})"
-        filter = filter + ")"
+        # construct a dict of Name = False (default) for each samaccountname given
+        # then, if we find our samaccountname in the cache or the result, grab the
+        # distinguishedname, put it in the dict, and return it (else the default of False).
+        return_value = {name.lower(): False for name in sam}
 
-        query_params = {"attributes": "distinguishedname;samaccountname", "filter": filter}
+        now = time.time()
+        to_resolve = []
+        for name in return_value:
+            cached = self._sam_cache_lookup(name, now) if self._sam_cache_ttl else None
+            if cached is None:
+                to_resolve.append(name)
+            else:
+                return_value[name] = cached
+                if cached:
+                    # remembered so a cached DN that no longer exists can be resolved again
+                    self._sam_cache_hits[self._normalize_dn(cached)] = name
+
+        if not to_resolve:
+            self.debug_print(f"_sam_to_dn return_value (cached) = {return_value}")
+            return action_result.set_status(phantom.APP_SUCCESS), return_value if keep_case else self._lower_dns(return_value)
+
+        # resolve in chunks so a large list never exceeds the server's filter
+        # limits, and escape each value so one odd name cannot break the batch
+        for i in range(0, len(to_resolve), self._sam_batch_size):
+            chunk = to_resolve[i : i + self._sam_batch_size]
+            filter = "(|{})".format("".join(f"(samaccountname={escape_filter_chars(name)})" for name in chunk))
+            query_params = {"attributes": "distinguishedname;samaccountname", "filter": filter}
+
+            ret_val, dn = self._paged_query(action_result, query_params)
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), {}
 
-        ret_val, dn = self._query(action_result, query_params)
-        if phantom.is_fail(ret_val):
-            return action_result.get_status(), {}
-        dn = json.loads(dn)
+            self.debug_print("_sam_to_dn entries = {}".format(dn["entries"]))
+            for entries in dn["entries"]:
+                samaccountname = (entries["attributes"]["sAMAccountName"]).lower()
+                if samaccountname in return_value:
+                    return_value[samaccountname] = entries["attributes"]["distinguishedName"]
 
-        # construct a dict of Name = False (default) for each samaccountname given
-        # then, if we find our samaccountname in the result, grab the distinguishedname,
-        # put it in the dict, and return it (else the default of False).
-        return_value = {name.lower(): False for name in sam}
-        self.debug_print("_sam_to_dn entries = {}".format(dn["entries"]))
-        for entries in dn["entries"]:
-            samaccountname = (entries["attributes"]["sAMAccountName"]).lower()
-            if samaccountname in return_value:
-                return_value[samaccountname] = (entries["attributes"]["distinguishedName"]).lower()
+        if self._sam_cache_ttl:
+            for name in to_resolve:
+                self._sam_cache_store(name, return_value[name], now)
 
         self.debug_print(f"_sam_to_dn return_value = {return_value}")
 
-        return action_result.set_status(phantom.APP_SUCCESS), return_value
+        return action_result.set_status(phantom.APP_SUCCESS), return_value if keep_case else self._lower_dns(return_value)
 
-    def _get_filtered_response(self):
+    def _lower_dns(self, user_dn):
+        """
+        returns a _sam_to_dn result with lowercased
+        distinguishednames, which most actions report.
         """
-        returns a list of objects from LDAP results
-        that do not match type=searchResRef
+        return {name: dn and dn.lower() for name, dn in user_dn.items()}
+
+    def _get_async_connection(self):
         """
+        returns a bound ASYNC connection to the same server as the
+        main connection, used to pipeline write operations.
+        """
+        if self._ldap_async_connection is None or self._ldap_async_connection.closed:
+            self._ldap_async_connection = ldap3.Connection(
+                self._ldap_server,
+                user=self._username,
+                password=self._password,
+                client_strategy=ldap3.ASYNC,
+                raise_exceptions=False,
+                receive_timeout=self._receive_timeout,
+                collect_usage=True,
+            )
+            self._open_connection(self._ldap_async_connection)
+            if not self._ldap_async_connection.bind():
+                raise Exception(f"Unable to bind the pipelined connection: {self._ldap_async_connection.last_error}")
+
+        return self._ldap_async_connection
+
+    def _collect_operation(self, connection, index, message_id, results):
         try:
-            return [i for i in self._ldap_connection.response if i["type"] != "searchResRef"]
+            _, result = connection.get_response(message_id, timeout=self._operation_timeout or None)
+            if result["result"] == RESULT_SUCCESS:
+                results[index] = (True, None)
+            else:
+                results[index] = (False, str(result))
         except Exception as e:
-            self.debug_print(f"get_filtered_response(), exception: {e!s}")
-            return []
+            self._dump_error_log(e)
+            results[index] = (False, self._get_error_message(e))
+
+    def _run_operations(self, operations):
+        """
+        Runs a list of (operation, args) tuples, e.g.
+        ("modify", (dn, changes)), and returns a list of
+        (success, error message) tuples in the same order.
+
+        With max_concurrency above 1 the operations are pipelined
+        over an ASYNC connection, keeping up to max_concurrency
+        requests in flight instead of waiting a full round trip
+        before sending the next one.
+        """
+        results = [None] * len(operations)
+
+        if self._max_concurrency <= 1 or len(operations) <= 1:
+            for i, (operation, args) in enumerate(operations):
+                try:
+                    with self._measure(operation):
+                        success = getattr(self._ldap_connection, operation)(*args)
+                    if success:
+                        results[i] = (True, None)
+                    else:
+                        results[i] = (False, str(self._ldap_connection.result))
+                except Exception as e:
+                    self._dump_error_log(e)
+                    results[i] = (False, self._get_error_message(e))
+        else:
+            with self._measure(operations[0][0], count=len(operations)):
+                results = self._pipeline_operations(operations, results)
+
+        # cached run query results below a written object may be stale now
+        written = []
+        for (operation, args), (success, _) in zip(operations, results):
+            if not success:
+                continue
+            written.append(args[0])
+            if operation == "modify_dn" and len(args) > 3 and args[3]:
+                written.append(args[3])
+            elif operation == "modify":
+                # linked values change on the other end too (memberOf)
+                written.extend(
+                    v for attribute, changes in args[1].items() if attribute.lower() == "member" for _, values in changes for v in values
+                )
+        if written:
+            self._query_cache_invalidate(written)
+
+        return results
+
+    def _pipeline_operations(self, operations, results):
+        """
+        fills results for operations sent over the ASYNC
+        connection, see _run_operations.
+        """
+        try:
+            connection = self._get_async_connection()
+        except Exception as e:
+            self._dump_error_log(e)
+            return [(False, str(e))] * len(operations)
+
+        in_flight = collections.deque()
+        for i, (operation, args) in enumerate(operations):
+            try:
+                message_id = getattr(connection, operation)(*args)
+                if message_id is False or message_id is None:
+                    results[i] = (False, str(connection.last_error))
+                else:
+                    in_flight.append((i, message_id))
+            except Exception as e:
+                self._dump_error_log(e)
+                results[i] = (False, str(e))
+
+            if len(in_flight) >= self._max_concurrency:
+                self._collect_operation(connection, *in_flight.popleft(), results)
+
+        while in_flight:
+            self._collect_operation(connection, *in_flight.popleft(), results)
+
+        return results
+
+    def _run_target_operations(self, action_result, targets, pending):
+        """
+        pending is a list of (target index, build) tuples, where
+        build(dn) returns the (operation, args) tuple to run for the
+        target's distinguishedname, see _run_operations. Returns the
+        (success, error) tuples in the same order.
+
+        Operations that failed because the target's distinguishedname
+        came from the cache and no longer exists are retried once
+        with the name resolved again.
+        """
+        results = self._run_operations([build(targets[i]["user_dn"]) for i, build in pending])
+
+        stale = [n for n, (_, error) in enumerate(results) if error and "noSuchObject" in error]
+        if not stale:
+            return results
+
+        _, refreshed = self._refresh_stale_targets(action_result, targets, [pending[n][0] for n in stale])
+        retry = [n for n in stale if pending[n][0] in refreshed]
+        for n, result in zip(retry, self._run_operations([pending[n][1](targets[pending[n][0]]["user_dn"]) for n in retry])):
+            results[n] = result
+
+        return results
 
     def _handle_group_members(self, param, add):
         """
@@ -219,17 +1202,11 @@ class AdLdapConnector(BaseConnector):
                 self.debug_print(f"n_groups = {n_groups}")
                 return action_result.set_status(phantom.APP_ERROR, "Not enough groups or members")
 
+        func = "added" if add else "removed"
         try:
-            if add:
-                func = "added"
-                ldap3.extend.microsoft.addMembersToGroups.ad_add_members_to_groups(
-                    connection=self._ldap_connection, members_dn=members, groups_dn=groups, fix=True, raise_error=True
-                )
-            else:
-                func = "removed"
-                ldap3.extend.microsoft.removeMembersFromGroups.ad_remove_members_from_groups(
-                    connection=self._ldap_connection, members_dn=members, groups_dn=groups, fix=True, raise_error=True
-                )
+            # fail early on malformed DNs instead of part way through the writes
+            for dn in members + groups:
+                safe_dn(dn)
         except Exception as e:
             self._dump_error_log(e)
             if type(e).__name__ == "LDAPInvalidDnError":
@@ -240,64 +1217,496 @@ class AdLdapConnector(BaseConnector):
                 error_msg = str(e)
             return action_result.set_status(phantom.APP_ERROR, error_msg)
 
-        # add action data results
-        for i in members:
-            for j in groups:
-                action_result.add_data({"member": i, "group": j, "function": func})
+        # members whose DN came from the cache are checked in the same searches. So are all
+        # members of a removal: a member the search cannot see (e.g. one from another domain
+        # of the forest) cannot be checked through memberOf and is removed unverified
+        checked = [m for m in members if not add or self._normalize_dn(m) in self._sam_cache_hits]
+        ret_val, existing = self._get_existing_dns(action_result, groups + checked)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        ret_val, refreshed = self._refresh_stale_dns(action_result, [dn for dn in groups + checked if self._normalize_dn(dn) not in existing])
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+        if refreshed:
+            members = [refreshed.get(self._normalize_dn(m), m) for m in members]
+            groups = [refreshed.get(self._normalize_dn(g), g) for g in groups]
+            members = [m for m in members if m]
+            groups = [g for g in groups if g]
+            existing.update(self._normalize_dn(dn) for dn in refreshed.values() if dn)
+            if not members or not groups:
+                return action_result.set_status(phantom.APP_ERROR, "Not enough groups or members")
+
+        unverified = set() if add else {self._normalize_dn(m) for m in members} - existing
+
+        # work out per group which members actually need to change, then send
+        # one permissive modify per group with all of them
+        operations = []
+        group_changes = []
+        for group in groups:
+            if self._normalize_dn(group) not in existing:
+                group_changes.append((group, [], False, f"{group} not found"))
+                continue
+
+            ret_val, current = self._get_existing_members(action_result, group, members)
+            if phantom.is_fail(ret_val):
+                return action_result.get_status()
+
+            # only verified changes are reported, but unverified removals are sent as well
+            changed = [m for m in members if (self._normalize_dn(m) in current) != add and self._normalize_dn(m) not in unverified]
+            send = changed + [m for m in members if self._normalize_dn(m) in unverified]
+            group_changes.append((group, changed, bool(send), None))
+            if send:
+                mod_type = ldap3.MODIFY_ADD if add else ldap3.MODIFY_DELETE
+                operations.append(("modify", (group, {"member": [(mod_type, send)]}, [PERMISSIVE_MODIFY_CONTROL])))
+
+        results = iter(self._run_operations(operations))
+        changed_count = 0
+        failed_groups = 0
+        written = False
+        for i, (group, changed, sent, error) in enumerate(group_changes):
+            if sent:
+                _, error = next(results)
+                group_changes[i] = (group, changed, sent, error)
+                written = written or not error
+            if error:
+                failed_groups += 1
+            changed = set() if error else {self._normalize_dn(m) for m in changed}
+            changed_count += len(changed)
+
+            # add action data results
+            for member in members:
+                ar_data = {"member": member, "group": group, "function": func, "changed": self._normalize_dn(member) in changed}
+                if error:
+                    ar_data["message"] = error
+                elif self._normalize_dn(member) in unverified:
+                    ar_data["message"] = "Membership could not be verified, the removal was sent"
+                action_result.add_data(ar_data)
+
+        if written:
+            self._group_cache_invalidate(members)
+        action_result.update_summary({"changed_memberships": changed_count})
+        if failed_groups == len(groups):
+            if len(groups) == 1:
+                return action_result.set_status(phantom.APP_ERROR, group_changes[0][3])
+            return action_result.set_status(phantom.APP_ERROR, f"Failed for all {len(groups)} groups")
         return action_result.set_status(phantom.APP_SUCCESS, "{} member(s) {} group(s)".format(func, "to" if func == "added" else "from"))
 
-    def _handle_unlock_account(self, param):
+    def _get_existing_dns(self, action_result, dns):
         """
-        This method unlocks an active directory account.
+        returns a tuple of status and the set of normalized
+        distinguishednames, out of the given ones, that exist.
+        """
+        existing = set()
+        for i in range(0, len(dns), self._sam_batch_size):
+            chunk = dns[i : i + self._sam_batch_size]
+            filter = "(|{})".format("".join(f"(distinguishedname={escape_filter_chars(self._normalize_dn(dn))})" for dn in chunk))
 
-        If the use_samaccountname is checked, method will resolve
-        the input samaccountname(user) -> distinguishedName and then use the
-        ldap3 library to unlock the account.
+            ret_val, resp = self._paged_query(action_result, {"attributes": "distinguishedname", "filter": filter})
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), existing
+
+            existing.update(self._normalize_dn(entry["dn"]) for entry in resp["entries"])
+
+        return phantom.APP_SUCCESS, existing
+
+    def _get_existing_members(self, action_result, group, members):
         """
-        action_result = self.add_action_result(ActionResult(dict(param)))
-        summary = action_result.update_summary({})
-        user = param["user"].lower()
-        ar_data = {}  # data for action_result
+        returns a tuple of status and the set of normalized member
+        DNs, out of the given ones, that are already in the group.
 
-        if param.get("use_samaccountname", False):
-            ret_val, user_dn = self._sam_to_dn([user], action_result=action_result)  # _sam_to_dn requires a list.
+        Membership is checked through the indexed memberOf back-link
+        of the candidate members, so the group's (possibly huge)
+        member attribute is never read.
+        """
+        existing = set()
+        group_filter = escape_filter_chars(self._normalize_dn(group))
+        for i in range(0, len(members), self._sam_batch_size):
+            chunk = members[i : i + self._sam_batch_size]
+            filter = "(&(memberof={})(|{}))".format(
+                group_filter, "".join(f"(distinguishedname={escape_filter_chars(self._normalize_dn(m))})" for m in chunk)
+            )
+
+            ret_val, resp = self._paged_query(action_result, {"attributes": "distinguishedname", "filter": filter})
             if phantom.is_fail(ret_val):
-                return action_result.get_status()
-            if len(user_dn) == 0 or user_dn[user] is False:
-                ar_data["unlocked"] = summary["unlocked"] = False
-                action_result.add_data(ar_data)
-                return action_result.set_status(phantom.APP_ERROR, "No users found")
-            ar_data["user_dn"] = user_dn[user]
-            ar_data["samaccountname"] = user
-            user = user_dn[user]
-        else:
-            ar_data["user_dn"] = user
+                return action_result.get_status(), existing
+
+            existing.update(self._normalize_dn(entry["dn"]) for entry in resp["entries"])
+
+        return phantom.APP_SUCCESS, existing
+
+    def _group_cache_lookup(self, dn, now):
+        """
+        returns the cached list of effective groups of the
+        normalized distinguishedname, or None if it is not cached.
+        """
+        entry = self._group_cache.get(dn)
+        if entry is None:
+            return None
+
+        groups, expires = entry
+        if expires < now:
+            del self._group_cache[dn]
+            return None
+
+        # move the entry to the end so eviction drops the least recently used
+        self._group_cache[dn] = self._group_cache.pop(dn)
+        return groups
+
+    def _group_cache_store(self, dn, groups, now):
+        if not self._group_cache_ttl:
+            return
+        self._group_cache.pop(dn, None)
+        self._group_cache[dn] = [sorted(groups), now + self._group_cache_ttl]
+        while len(self._group_cache) > GROUP_CACHE_SIZE:
+            del self._group_cache[next(iter(self._group_cache))]
+
+    def _group_cache_invalidate(self, dns):
+        """
+        drops the cached memberships of the given distinguishednames,
+        of objects underneath them and of everything that is (nested)
+        in one of them, since their effective groups may have changed.
+        """
+        dns = [self._normalize_dn(dn) for dn in dns]
+
+        def affected(dn):
+            return any(dn == i or dn.endswith("," + i) for i in dns)
+
+        stale = [k for k, (groups, _) in self._group_cache.items() if affected(k) or any(affected(g) for g in groups)]
+        for dn in stale:
+            del self._group_cache[dn]
+
+    def _get_member_of(self, action_result, dns):
+        """
+        returns a tuple of status and a dict of normalized
+        distinguishedname -> list of normalized groups it is a
+        direct member of, read in chunked memberOf searches.
+        """
+        member_of = {dn: [] for dn in dns}
+        for i in range(0, len(dns), self._sam_batch_size):
+            chunk = dns[i : i + self._sam_batch_size]
+            filter = "(|{})".format("".join(f"(distinguishedname={escape_filter_chars(dn)})" for dn in chunk))
+
+            ret_val, resp = self._paged_query(action_result, {"attributes": "memberof", "filter": filter})
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), member_of
+
+            for entry in resp["entries"]:
+                groups = next((v for k, v in entry["attributes"].items() if k.lower() == "memberof"), [])
+                member_of[self._normalize_dn(entry["dn"])] = [self._normalize_dn(g) for g in groups]
+
+        return phantom.APP_SUCCESS, member_of
+
+    def _get_effective_groups(self, action_result, dn):
+        """
+        returns a tuple of status, the set of normalized groups the
+        normalized distinguishedname is transitively a member of and
+        the method used ("cache", "in_chain" or "breadth_first").
+
+        The server walks the chain with LDAP_MATCHING_RULE_IN_CHAIN
+        where it is supported, otherwise memberOf is expanded breadth
+        first, reusing the cached memberships of the groups on the way.
+        """
+        now = time.time()
+        cached = self._group_cache_lookup(dn, now) if self._group_cache_ttl else None
+        if cached is not None:
+            return phantom.APP_SUCCESS, set(cached), "cache"
+
+        filter = f"(member:{LDAP_MATCHING_RULE_IN_CHAIN}:={escape_filter_chars(dn)})"
+        ret_val, resp = self._paged_query(action_result, {"attributes": "distinguishedname", "filter": filter})
+        if phantom.is_success(ret_val):
+            groups = {self._normalize_dn(entry["dn"]) for entry in resp["entries"]}
+            self._group_cache_store(dn, groups, now)
+            return phantom.APP_SUCCESS, groups, "in_chain"
+
+        self.debug_print(f"_get_effective_groups, in-chain search failed, expanding memberOf: {action_result.get_message()}")
+        action_result.set_status(phantom.APP_SUCCESS)
+
+        groups = set()
+        frontier = [dn]
+        while frontier:
+            ret_val, member_of = self._get_member_of(action_result, frontier)
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), groups, "breadth_first"
+
+            frontier = []
+            for parent in (g for node in member_of.values() for g in node):
+                if parent in groups or parent == dn:
+                    continue
+                groups.add(parent)
+                cached = self._group_cache_lookup(parent, now) if self._group_cache_ttl else None
+                if cached is None:
+                    frontier.append(parent)
+                else:
+                    groups.update(cached)
+
+        self._group_cache_store(dn, groups, now)
+        return phantom.APP_SUCCESS, groups, "breadth_first"
+
+    def _handle_get_effective_membership(self, param):
+        """
+        returns the groups a principal is a direct or nested member
+        of, or, if groups are given, whether it is effectively a
+        member of each of them.
+        """
+        action_result = self.add_action_result(ActionResult(dict(param)))
+        summary = action_result.update_summary({})
 
         if not self._ldap_bind(action_result):
-            ar_data["unlocked"] = summary["unlocked"] = False
-            action_result.add_data(ar_data)
             return action_result.get_status()
 
+        principal = param["principal"].strip()
+        value = escape_filter_chars(principal)
+        ret_val, resp = self._paged_query(
+            action_result,
+            {
+                "attributes": "distinguishedname",
+                "filter": f"(|(userprincipalname={value})(samaccountname={value})(distinguishedname={value}))",
+            },
+        )
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+        if not resp["entries"]:
+            return action_result.set_status(phantom.APP_ERROR, f"No principal found for {principal}")
+        if len(resp["entries"]) > 1:
+            return action_result.set_status(phantom.APP_ERROR, f"More than one principal found for {principal}")
+
+        principal_dn = self._normalize_dn(resp["entries"][0]["dn"])
+        ret_val, effective, method = self._get_effective_groups(action_result, principal_dn)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        summary["principal_dn"] = principal_dn
+        summary["total_groups"] = len(effective)
+        summary["method"] = method
+
+        groups = [i.strip() for i in param.get("groups", "").split(";") if i.strip()]
+        if not groups:
+            for group in sorted(effective):
+                action_result.add_data({"group_dn": group, "is_member": True})
+            return action_result.set_status(phantom.APP_SUCCESS)
+
+        # resolve the groups to check, which may be given by name or distinguishedname
+        filter = "(&(objectclass=group)(|{}))".format(
+            "".join(f"(samaccountname={escape_filter_chars(g)})(distinguishedname={escape_filter_chars(g)})" for g in groups)
+        )
+        ret_val, resp = self._paged_query(action_result, {"attributes": "samaccountname", "filter": filter})
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        resolved = {}
+        for entry in resp["entries"]:
+            dn = self._normalize_dn(entry["dn"])
+            resolved[dn] = dn
+            sam = next((v for k, v in entry["attributes"].items() if k.lower() == "samaccountname"), None)
+            if sam:
+                resolved[sam.lower()] = dn
+
+        matched = 0
+        for group in groups:
+            group_dn = resolved.get(group.lower()) or resolved.get(self._normalize_dn(group))
+            ar_data = {"group": group, "group_dn": group_dn, "is_member": group_dn in effective}
+            if group_dn is None:
+                ar_data["message"] = "Group not found"
+            matched += ar_data["is_member"]
+            action_result.add_data(ar_data)
+
+        summary["matched_groups"] = matched
+        return action_result.set_status(phantom.APP_SUCCESS)
+
+    def _normalize_dn(self, dn):
+        """
+        returns a lowercase distinguishedname without the optional
+        whitespace around separators, for comparing DNs.
+        """
         try:
-            ldap3.extend.microsoft.unlockAccount.ad_unlock_account(
-                self._ldap_connection,
-                user_dn=ar_data["user_dn"],
-            )
-            ar_data["unlocked"] = True
-        except Exception as e:
-            self._dump_error_log(e)
-            ar_data["unlocked"] = summary["unlocked"] = False
+            return ",".join(f"{attr}={value}" for attr, value, _ in parse_dn(dn, strip=True)).lower()
+        except Exception:
+            return dn.lower()
+
+    def _resolve_targets(self, action_result, users, use_samaccountname=False, keep_case=False):
+        """
+        returns a tuple of status and a list of action data dicts,
+        one per requested user. If use_samaccountname is set, all
+        names are resolved in one batch; names that could not be
+        resolved are returned without a "user_dn" key. See _sam_to_dn
+        for keep_case.
+        """
+        if not use_samaccountname:
+            return phantom.APP_SUCCESS, [{"user_dn": user} for user in users]
+
+        ret_val, user_dn = self._sam_to_dn(users, action_result=action_result, keep_case=keep_case)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), []
+
+        targets = []
+        for user in users:
+            ar_data = {"samaccountname": user}
+            if user_dn.get(user):
+                ar_data["user_dn"] = user_dn[user]
+            targets.append(ar_data)
+
+        return phantom.APP_SUCCESS, targets
+
+    def _get_user_account_control(self, action_result, dns):
+        """
+        returns a tuple of status and a dict of normalized
+        distinguishedname -> userAccountControl (int), read for
+        all the given DNs in as few searches as possible.
+        """
+        uac = {}
+        for i in range(0, len(dns), self._sam_batch_size):
+            chunk = dns[i : i + self._sam_batch_size]
+            filter = "(|{})".format("".join(f"(distinguishedname={escape_filter_chars(self._normalize_dn(dn))})" for dn in chunk))
+
+            ret_val, resp = self._paged_query(action_result, {"attributes": "useraccountcontrol", "filter": filter})
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), {}
+
+            for entry in resp["entries"]:
+                # objects without a userAccountControl (groups, contacts, ...) are left out, so they fail as "No user found"
+                value = next((v for k, v in entry["attributes"].items() if k.lower() == "useraccountcontrol"), None)
+                if isinstance(value, list):
+                    value = value[0] if value else None
+                try:
+                    uac[self._normalize_dn(entry["dn"])] = int(value)
+                except (TypeError, ValueError):
+                    self.debug_print(f"_get_user_account_control, no userAccountControl on {entry['dn']}")
+
+        return phantom.APP_SUCCESS, uac
+
+    def _set_bulk_status(self, action_result, targets, failed, noun="account"):
+        """
+        adds one data row per target, records the succeeded and
+        failed counts in the summary and sets the action status.
+
+        failed maps the index of a failed target to its error
+        message. The action only fails if every target failed.
+        """
+        for i, ar_data in enumerate(targets):
+            if i in failed:
+                ar_data["message"] = failed[i]
             action_result.add_data(ar_data)
-            return action_result.set_status(phantom.APP_ERROR, str(e))
 
-        action_result.add_data(ar_data)
-        summary["unlocked"] = True
+        action_result.update_summary({"succeeded": len(targets) - len(failed), "failed": len(failed)})
+
+        if targets and len(failed) == len(targets):
+            if len(targets) == 1:
+                return action_result.set_status(phantom.APP_ERROR, failed[0])
+            return action_result.set_status(phantom.APP_ERROR, f"Failed for all {len(targets)} {noun}s")
+
         return action_result.set_status(phantom.APP_SUCCESS)
 
+    def _handle_unlock_account(self, param):
+        """
+        This method unlocks one or more active directory accounts.
+
+        If the use_samaccountname is checked, method will resolve
+        the input samaccountname(s) -> distinguishedName in a single
+        batch and then use the ldap3 library to unlock each account
+        over the same bound connection.
+        """
+        action_result = self.add_action_result(ActionResult(dict(param)))
+        summary = action_result.update_summary({})
+        users = list(dict.fromkeys(i.strip().lower() for i in param["user"].split(";") if i.strip()))
+
+        ret_val, targets = self._resolve_targets(action_result, users, param.get("use_samaccountname", False))
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        if not self._ldap_bind(action_result):
+            for ar_data in targets:
+                ar_data["unlocked"] = False
+                action_result.add_data(ar_data)
+            summary["unlocked"] = False
+            return action_result.get_status()
+
+        def unlock(dn):
+            # same change as ldap3.extend.microsoft.unlockAccount.ad_unlock_account, so it can be pipelined
+            return "modify", (dn, {"lockoutTime": [(ldap3.MODIFY_REPLACE, ["0"])]})
+
+        failed = {}
+        pending = []
+        for i, ar_data in enumerate(targets):
+            ar_data["unlocked"] = False
+            if "user_dn" not in ar_data:
+                failed[i] = "No users found"
+                continue
+            pending.append((i, unlock))
+
+        for (i, _), (success, error) in zip(pending, self._run_target_operations(action_result, targets, pending)):
+            if success:
+                targets[i]["unlocked"] = True
+            else:
+                failed[i] = error
+
+        summary["unlocked"] = not failed
+        return self._set_bulk_status(action_result, targets, failed)
+
+    def _modify_user_account_control(self, action_result, targets, set_flags=0, clear_flags=0):
+        """
+        Reads the userAccountControl of every target in batched
+        searches, sets set_flags and clears clear_flags, and sends
+        modifies (pipelined if enabled) for the entries whose value
+        actually changes.
+
+        Every target dict gets a "modified" key. Returns a tuple of
+        status, a dict of failed target index -> error message and a
+        dict of target index -> original userAccountControl (int).
+        """
+        failed = {}
+        original = {}
+        operations = []
+        pending = []
+
+        ret_val, uac_map = self._get_user_account_control(action_result, [t["user_dn"] for t in targets if "user_dn" in t])
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), failed, original
+
+        missing = [i for i, t in enumerate(targets) if "user_dn" in t and self._normalize_dn(t["user_dn"]) not in uac_map]
+        ret_val, refreshed = self._refresh_stale_targets(action_result, targets, missing)
+        if refreshed:
+            ret_val, refreshed_map = self._get_user_account_control(action_result, [targets[i]["user_dn"] for i in refreshed])
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), failed, original
+            uac_map.update(refreshed_map)
+
+        for i, ar_data in enumerate(targets):
+            ar_data["modified"] = False
+            if "user_dn" not in ar_data:
+                failed[i] = "No users found"
+                continue
+
+            uac = uac_map.get(self._normalize_dn(ar_data["user_dn"]))
+            if uac is None:
+                failed[i] = "No user found"
+                continue
+            original[i] = uac
+
+            mod_uac = (uac | set_flags) & (0xFFFFFFFF ^ clear_flags)
+            if mod_uac == uac:
+                # already in the requested state, nothing to write
+                continue
+
+            operations.append(("modify", (ar_data["user_dn"], {"userAccountControl": [(ldap3.MODIFY_REPLACE, [mod_uac])]})))
+            pending.append(i)
+
+        for i, (success, error) in zip(pending, self._run_operations(operations)):
+            if success:
+                targets[i]["modified"] = True
+            else:
+                self.debug_print(f"modify_user_account_control error = {error}")
+                failed[i] = error
+
+        return phantom.APP_SUCCESS, failed, original
+
     def _handle_account_status(self, param, disable=False):
         """
         This reads in the existing UAC and _only_ modifies the disabled flag. Does not
         reset any additional flags.
+
+        Accepts a semi-colon separated list of users; accounts that
+        are already in the requested state are not written to.
         """
         action_result = self.add_action_result(ActionResult(dict(param)))
         summary = action_result.update_summary({})
@@ -305,93 +1714,163 @@ class AdLdapConnector(BaseConnector):
         if not self._ldap_bind(action_result):
             return action_result.get_status()
 
-        user = param["user"].lower()
-        ar_data = {}
+        users = list(dict.fromkeys(i.strip().lower() for i in param["user"].split(";") if i.strip()))
+
+        # let the analyst use samaccountname if they wish
+        ret_val, targets = self._resolve_targets(action_result, users, param.get("use_samaccountname", False))
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        flag = UAC_FLAGS["ACCOUNTDISABLE"]
+        if disable:
+            ret_val, failed, original = self._modify_user_account_control(action_result, targets, set_flags=flag)
+        else:  # enable
+            ret_val, failed, original = self._modify_user_account_control(action_result, targets, clear_flags=flag)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        # capture the original status for logging
+        for i, uac in original.items():
+            targets[i]["starting_status"] = "disabled" if (uac & flag != 0) else "enabled"
+
+        if len(failed) < len(targets):
+            summary["account_status"] = actstr
+        return self._set_bulk_status(action_result, targets, failed)
+
+    def _handle_set_account_flag(self, param):
+        """
+        Sets or clears a single userAccountControl flag
+        (e.g. DONT_EXPIRE_PASSWORD) on one or more accounts,
+        leaving every other flag untouched.
+        """
+        action_result = self.add_action_result(ActionResult(dict(param)))
+        self.save_progress(f"In action handler for: {self.get_action_identifier()}")
+        summary = action_result.update_summary({})
+
+        flag_name = param["flag"].strip().upper()
+        state = param["state"].strip().upper()
+        if flag_name not in UAC_FLAGS:
+            return action_result.set_status(phantom.APP_ERROR, "Please provide a valid value in the 'flag' parameter")
+        if state not in ("SET", "CLEAR"):
+            return action_result.set_status(phantom.APP_ERROR, "Please provide a valid value in the 'state' parameter")
+
+        if not self._ldap_bind(action_result):
+            return action_result.get_status()
+
+        users = list(dict.fromkeys(i.strip().lower() for i in param["user"].split(";") if i.strip()))
+        ret_val, targets = self._resolve_targets(action_result, users, param.get("use_samaccountname", False))
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        flag = UAC_FLAGS[flag_name]
+        if state == "SET":
+            ret_val, failed, original = self._modify_user_account_control(action_result, targets, set_flags=flag)
+        else:
+            ret_val, failed, original = self._modify_user_account_control(action_result, targets, clear_flags=flag)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        for i, uac in original.items():
+            targets[i]["starting_state"] = uac & flag != 0
 
-        # let the analyst use samaccountname if they wish
-        if param.get("use_samaccountname", False):
-            ret_val, user_info = self._sam_to_dn([user], action_result=action_result)
-            if phantom.is_fail(ret_val):
-                return action_result.get_status()
-            ar_data["samaccountname"] = user
-            if user_info[user] is False:
-                return action_result.set_status(phantom.APP_ERROR, "No users found")
-            else:
-                ar_data["user_dn"] = user_info[user]
-                ar_data["samaccountname"] = user
-                user = user_info[user]
-        else:
-            ar_data["user_dn"] = user
+        summary["flag"] = flag_name
+        summary["state"] = state
+        summary["modified"] = len([t for t in targets if t["modified"]])
+        return self._set_bulk_status(action_result, targets, failed)
 
-        try:
-            query_params = {"attributes": "useraccountcontrol", "filter": f"(distinguishedname={user})"}
-            ret_val, resp = self._query(action_result, query_params)
-            if phantom.is_fail(ret_val):
-                return action_result.get_status()
-            resp = json.loads(resp)
+    def _modify_dns(self, action_result, targets, requests):
+        """
+        Renames and/or moves objects. requests is a list of (target
+        index, new rdn or None to keep it, new superior or None to
+        keep it) tuples. The modify_dn requests are sent grouped by
+        destination and pipelined if enabled.
 
-            if len(resp["entries"]) == 0:
-                return action_result.set_status(phantom.APP_ERROR, "No user found")
+        Every target dict that was renamed or moved gets its
+        "new_dn". Returns a dict of failed target index -> error.
+        """
 
-            uac = int(resp["entries"][0]["attributes"]["userAccountControl"])
+        def get_new_dn(dn, rdn, superior):
+            rdns = to_dn(safe_dn(dn))
+            return ",".join([rdn or rdns[0], superior] if superior else [rdn or rdns[0], *rdns[1:]])
 
-            # capture the original status for logging
-            init_status = "disabled" if (uac & 0x02 != 0) else "enabled"
-            ar_data["starting_status"] = init_status
+        def modify_dn(rdn, superior):
+            return lambda dn: ("modify_dn", (dn, rdn or to_dn(safe_dn(dn))[0], True, superior))
 
-            if disable:
-                mod_uac = uac | 0x02
-            else:  # enable
-                mod_uac = uac & (0xFFFFFFFF ^ 0x02)
+        failed = {}
+        pending = []
+        new_dns = {}
+        for i, rdn, superior in sorted(requests, key=lambda request: (request[2] or "").lower()):
+            try:
+                safe_dn(targets[i]["user_dn"])
+            except Exception as e:
+                failed[i] = str(e)
+                continue
+
+            pending.append((i, modify_dn(rdn, superior)))
+            new_dns[i] = (rdn, superior)
+
+        modified = []
+        for (i, _), (success, error) in zip(pending, self._run_target_operations(action_result, targets, pending)):
+            if success:
+                targets[i]["new_dn"] = get_new_dn(targets[i]["user_dn"], *new_dns[i])
+                modified.append(targets[i]["user_dn"])
+                self._sam_cache_invalidate(targets[i]["user_dn"])
+            else:
+                self.debug_print(f"modify_dns error = {error}")
+                failed[i] = error
 
-            res = self._ldap_connection.modify(user, {"userAccountControl": [(ldap3.MODIFY_REPLACE, [mod_uac])]})
-            if not res:
-                return action_result.set_status(phantom.APP_ERROR, self._ldap_connection.result)
-        except Exception as e:
-            self._dump_error_log(e)
-            self.debug_print(f"disable_account error = {e!s}")
-            return action_result.set_status(phantom.APP_ERROR, str(e))
+        if modified:
+            self._group_cache_invalidate(modified)
 
-        summary["account_status"] = actstr
-        action_result.add_data(ar_data)
-        return action_result.set_status(phantom.APP_SUCCESS)
+        return failed
 
     def _handle_move_object(self, param):
         """
-        Moves an arbitrary object within the
-        directory to a new OU.
+        Moves one or more objects within the directory to a
+        new OU, or to one OU each. sAMAccountNames are resolved
+        in one batch and the moves are sent grouped by
+        destination OU, pipelined if enabled.
         """
         action_result = self.add_action_result(ActionResult(dict(param)))
         self.save_progress(f"In action handler for: {self.get_action_identifier()}")
         summary = action_result.update_summary({})
-        ar_data = {}
 
-        obj = param["object"]
-        destination_ou = param["destination_ou"]
-        self.debug_print("Moving an object in AD")
+        use_samaccountname = param.get("use_samaccountname", False)
+        objects = [i.strip().lower() if use_samaccountname else i.strip() for i in param["object"].split(";") if i.strip()]
+        destinations = [i.strip() for i in param["destination_ou"].split(";") if i.strip()]
+        if len(destinations) not in (1, len(objects)):
+            return action_result.set_status(phantom.APP_ERROR, "Please provide one 'destination_ou' for all objects or one per object")
+        if len(destinations) == 1:
+            destinations *= len(objects)
+        self.debug_print("Moving objects in AD")
 
         if not self._ldap_bind(action_result):
-            ar_data["moved"] = summary["moved"] = False
-            action_result.add_data(ar_data)
+            summary["moved"] = False
             return action_result.get_status()
 
-        try:
-            cn = "=".join(parse_dn(obj)[0][:-1])
-            res = self._ldap_connection.modify_dn(obj, cn, new_superior=destination_ou)
-            if not res:
-                ar_data["moved"] = summary["moved"] = False
-                action_result.add_data(ar_data)
-                return action_result.set_status(phantom.APP_ERROR, self._ldap_connection.result)
-            ar_data["source_object"] = obj
+        # new DNs are built from the source DN, so keep it as the server returned it
+        ret_val, targets = self._resolve_targets(action_result, objects, use_samaccountname, keep_case=True)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        failed = {}
+        requests = []
+        for i, (ar_data, destination_ou) in enumerate(zip(targets, destinations)):
             ar_data["destination_container"] = destination_ou
-        except Exception as e:
-            self._dump_error_log(e)
-            ar_data["moved"] = summary["moved"] = False
-            action_result.add_data(ar_data)
-            return action_result.set_status(phantom.APP_ERROR, str(e))
-        action_result.add_data(ar_data)
-        summary["moved"] = True
-        return action_result.set_status(phantom.APP_SUCCESS)
+            if "user_dn" not in ar_data:
+                failed[i] = "No object found"
+                continue
+            requests.append((i, None, destination_ou))
+
+        failed.update(self._modify_dns(action_result, targets, requests))
+        for i, ar_data in enumerate(targets):
+            if "user_dn" in ar_data:
+                ar_data["source_object"] = ar_data["user_dn"]
+            ar_data["moved"] = i not in failed
+
+        summary["total_objects"] = len(targets)
+        summary["moved"] = not failed
+        return self._set_bulk_status(action_result, targets, failed, noun="object")
 
     def _handle_test_connectivity(self, param):
         action_result = self.add_action_result(ActionResult(dict(param)))
@@ -401,6 +1880,13 @@ class AdLdapConnector(BaseConnector):
             self.save_progress("Test Connectivity Failed")
             return action_result.get_status()
 
+        if self._connect_timings:
+            self.save_progress(
+                "Connected in {connect}s, TLS handshake {tls_handshake}s (session resumed: {tls_session_resumed}), bind {bind}s".format(
+                    **self._connect_timings
+                )
+            )
+
         # success
         self.save_progress("Test Connectivity Passed")
         return action_result.set_status(action_result.get_status())
@@ -413,23 +1899,143 @@ class AdLdapConnector(BaseConnector):
         if not self._ldap_bind(action_result):
             return action_result.get_status()
 
-        query = "(|"
-        principal = [i.strip() for i in param["principals"].split(";")]
+        principals = list(dict.fromkeys(i.strip() for i in param["principals"].split(";") if i.strip()))
         self.debug_print("Fetching attributes for a principal")
 
-        # build a query on the fly with the principals provided
-        for i in principal:
-            query += f"(userprincipalname={i})(samaccountname={i})(distinguishedname={i})"
-        query += ")"
+        ret_val, page_size, max_results, max_values = self._get_paging_params(action_result, param)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        dns, terms = self._plan_principal_lookups(principals)
+        self.debug_print(f"get_attributes, {len(dns)} base lookups and {len(terms)} filter terms")
 
-        ret_val, resp = self._query(action_result, {"filter": query, "attributes": param["attributes"]})
+        ret_val, out_data = self._read_entries(action_result, dns, param, max_results=max_results, max_values=max_values)
         if phantom.is_fail(ret_val):
             return action_result.get_status()
 
-        action_result.add_data(json.loads(resp))
-        summary["total_objects"] = len(self._get_filtered_response())
+        # the rest in batches of compact filters on indexed attributes
+        seen = {entry["dn"].lower() for entry in out_data["entries"]}
+        for i in range(0, len(terms), self._sam_batch_size):
+            remaining = max_results - len(out_data["entries"]) if max_results else 0
+            if out_data["truncated"] or (max_results and remaining <= 0):
+                out_data["truncated"] = True
+                break
+
+            query = "(|{})".format("".join(terms[i : i + self._sam_batch_size]))
+            ret_val, batch = self._paged_query(
+                action_result,
+                {"filter": query, "attributes": param["attributes"]},
+                page_size=page_size,
+                max_results=remaining,
+                max_values=max_values,
+            )
+            if phantom.is_fail(ret_val):
+                return action_result.get_status()
+
+            # a principal given as both DN and name is only returned once
+            for entry in batch["entries"]:
+                if entry["dn"].lower() not in seen:
+                    seen.add(entry["dn"].lower())
+                    out_data["entries"].append(entry)
+            out_data["truncated"] = batch["truncated"]
+            out_data["capped_attributes"] += batch["capped_attributes"]
+
+        truncated = out_data.pop("truncated")
+        capped_attributes = out_data.pop("capped_attributes")
+        action_result.add_data(out_data)
+        summary["total_objects"] = len(out_data["entries"])
+        summary["truncated"] = truncated
+        summary["capped_attributes"] = capped_attributes
         return action_result.set_status(phantom.APP_SUCCESS)
 
+    def _plan_principal_lookups(self, principals):
+        """
+        returns (dns, terms): the principals that are distinguished
+        names, to be read with base searches, and escaped filter
+        terms for the others on the indexed attribute matching
+        their format: objectSid for SIDs, objectGUID for GUIDs,
+        userPrincipalName for UPNs and sAMAccountName otherwise.
+        """
+        dns = []
+        terms = []
+        for principal in principals:
+            if "=" in principal:
+                dns.append(principal)
+            elif re.match(SID_REGEX, principal, re.IGNORECASE):
+                terms.append(f"(objectSid={escape_filter_chars(principal)})")
+            elif re.match(GUID_REGEX, principal):
+                terms.append(f"(objectGUID={escape_bytes(uuid.UUID(principal.strip('{}')).bytes_le)})")
+            elif "@" in principal:
+                terms.append(f"(userPrincipalName={escape_filter_chars(principal)})")
+            else:
+                # a DOMAIN\name logon name carries the sAMAccountName after the backslash
+                sam = principal.rsplit("\\", 1)[-1]
+                terms.append(f"(sAMAccountName={escape_filter_chars(sam)})")
+
+        return dns, list(dict.fromkeys(terms))
+
+    @timed("query")
+    def _read_entries(self, action_result, dns, param, max_results=0, max_values=0):
+        """
+        reads the objects with the given distinguished names with
+        base searches, skipping the ones that do not exist.
+
+        Returns a tuple of (status, data) with data in the
+        _paged_query layout. param must include "attributes".
+        """
+        attrs = [i.strip() for i in param["attributes"].split(";")]
+        out_data = {"entries": [], "truncated": False, "capped_attributes": 0}
+        seen = set()
+        for dn in dns:
+            if max_results and len(out_data["entries"]) >= max_results:
+                out_data["truncated"] = True
+                break
+
+            attempt = 0
+            read = len(out_data["entries"])
+            capped = out_data["capped_attributes"]
+            while True:
+                try:
+                    if not self._ldap_bind(action_result):
+                        return action_result.get_status(), out_data
+
+                    self._ldap_connection.search(
+                        search_base=dn,
+                        search_filter="(objectClass=*)",
+                        search_scope=ldap3.BASE,
+                        attributes=attrs,
+                        time_limit=self._operation_timeout,
+                    )
+                    # expanding ranged attributes runs searches of its own
+                    for entry in self._ldap_connection.response:
+                        if entry["type"] == "searchResEntry" and entry["dn"].lower() not in seen:
+                            self._expand_ranged_attributes(entry, out_data, max_values)
+                            out_data["entries"].append(self._entry_to_dict(entry))
+                            seen.add(entry["dn"].lower())
+                    break
+                except (LDAPInvalidDnError, LDAPInvalidDNSyntaxResult, LDAPNoSuchObjectResult) as e:
+                    self.debug_print(f"_read_entries, skipping {dn}: {e!s}")
+                    break
+                except Exception as e:
+                    if isinstance(e, TRANSIENT_LDAP_ERRORS) and attempt < self._max_retries:
+                        # base reads are safe to repeat, read this object again on a fresh connection
+                        delay = self._get_retry_delay(attempt)
+                        attempt += 1
+                        self.debug_print(f"_read_entries, transient error: {e!s}, retry {attempt} of {self._max_retries} in {delay:.2f}s")
+                        time.sleep(delay)
+                        del out_data["entries"][read:]
+                        out_data["capped_attributes"] = capped
+                        try:
+                            self._ldap_connection.unbind()
+                        except Exception:
+                            pass
+                        continue
+
+                    self._dump_error_log(e)
+                    return action_result.set_status(phantom.APP_ERROR, self._get_error_message(e)), out_data
+
+        return action_result.set_status(phantom.APP_SUCCESS), out_data
+
     def _handle_set_attribute(self, param):
         action_result = self.add_action_result(ActionResult(dict(param)))
         summary = action_result.update_summary({})
@@ -476,8 +2082,16 @@ class AdLdapConnector(BaseConnector):
 
         try:
             self.debug_print(f"mod_string = {changes}")
-            ret = self._ldap_connection.modify(dn=ar_data["user_dn"], changes=changes)
+            ret, ar_data["user_dn"] = self._modify_with_retry(
+                action_result, ar_data["user_dn"], lambda dn: self._ldap_connection.modify(dn=dn, changes=changes)
+            )
             self.debug_print(f"handle_set_attribute, ret = {ret}")
+            if ret and attribute.lower() == "samaccountname":
+                self._sam_cache_invalidate(ar_data["user_dn"])
+            if ret and attribute.lower() == "member":
+                self._group_cache_invalidate([ar_data["user_dn"]] + ([value] if value else []))
+            if ret:
+                self._query_cache_invalidate([ar_data["user_dn"]] + ([value] if value and attribute.lower() == "member" else []))
         except Exception as e:
             self._dump_error_log(e)
             action_result.add_data({"message": "Failed"})
@@ -490,79 +2104,452 @@ class AdLdapConnector(BaseConnector):
         self.debug_print(f"resp = {self._ldap_connection.response_to_json()}")
         return action_result.set_status(phantom.APP_SUCCESS)
 
-    def _handle_rename_object(self, param):
+    def _to_attribute_text(self, value):
+        # the text form an attribute value is compared by, AD writes booleans as TRUE/FALSE
+        if isinstance(value, bool):
+            return "TRUE" if value else "FALSE"
+        return str(value)
+
+    def _parse_change_set(self, changes):
+        """
+        parses a JSON change set of the form
+        {object: {attribute: value or list of values or null, ...}}
+        where a value replaces the current values and null clears
+        them, or {attribute: {"add": [...], "delete": [...],
+        "replace": [...]}} for finer control. An empty delete list
+        deletes all values.
+
+        Returns a dict of object (lowercase) -> list of (attribute,
+        operation, values) tuples, raises ValueError if invalid.
+        """
+        try:
+            change_set = json.loads(changes)
+        except Exception as e:
+            raise ValueError(str(e))
+        if not isinstance(change_set, dict) or not change_set:
+            raise ValueError("expected an object mapping objects to attribute changes")
+
+        parsed = {}
+        for obj, attributes in change_set.items():
+            if not isinstance(attributes, dict) or not attributes:
+                raise ValueError(f"expected an object of attribute changes for '{obj}'")
+
+            operations = parsed.setdefault(obj.strip().lower(), [])
+            for attribute, value in attributes.items():
+                if isinstance(value, dict):
+                    if not value or set(value) - set(CHANGE_SET_OPERATIONS):
+                        raise ValueError(f"the operations of '{attribute}' must be one of {', '.join(CHANGE_SET_OPERATIONS)}")
+                    items = value.items()
+                else:
+                    items = [("replace", value)]
+
+                for operation, values in items:
+                    if values is None:
+                        values = []
+                    elif not isinstance(values, list):
+                        values = [values]
+                    operations.append((attribute, operation, [self._to_attribute_text(v) for v in values]))
+
+        return parsed
+
+    def _get_current_values(self, action_result, dns, attributes):
+        """
+        returns a tuple of status and a dict of normalized
+        distinguishedname -> {lowercase attribute: [values as text]}
+        read for all the given DNs in as few searches as possible.
+        """
+        current = {}
+        for i in range(0, len(dns), self._sam_batch_size):
+            chunk = dns[i : i + self._sam_batch_size]
+            filter = "(|{})".format("".join(f"(distinguishedname={escape_filter_chars(self._normalize_dn(dn))})" for dn in chunk))
+
+            ret_val, resp = self._paged_query(action_result, {"attributes": ";".join(attributes), "filter": filter})
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), {}
+
+            for entry in resp["entries"]:
+                current[self._normalize_dn(entry["dn"])] = {
+                    k.lower(): [self._to_attribute_text(v) for v in (value if isinstance(value, list) else [value])]
+                    for k, value in entry["attributes"].items()
+                }
+
+        return phantom.APP_SUCCESS, current
+
+    def _get_value_key(self, attribute):
+        """
+        returns the function that maps a value of the attribute to
+        what the server compares, following the attribute's syntax
+        in the schema: DNs are normalized and directory strings
+        lowercased. Returns None if the syntax is not known (no
+        schema, or neither of those syntaxes).
+        """
+        schema = self._ldap_server.schema if self._ldap_server else None
+        attribute_type = schema.attribute_types.get(attribute) if schema else None
+        syntax = attribute_type.syntax if attribute_type else None
+        if syntax == DN_SYNTAX:
+            return self._normalize_dn
+        if syntax in CASE_IGNORE_SYNTAXES:
+            return str.lower
+        return None
+
+    def _get_effective_changes(self, operations, current):
+        """
+        returns (changes, skipped): the ldap3 changes dict of the
+        operations that change the current values of an object,
+        and the attributes whose operations were all no-ops.
+
+        Values are matched the way the server matches them (see
+        _get_value_key). When that is not known, adds are only
+        dropped for exact matches and deletes are always sent; the
+        permissive modify control makes either write harmless.
+        """
+        changes = {}
+        for attribute, operation, values in operations:
+            present = current.get(attribute.lower(), [])
+            key = self._get_value_key(attribute)
+            present_keys = {(key or str)(v) for v in present}
+            if operation == "replace":
+                # a directory string that only changes case is still a change of the stored value
+                replace_key = self._normalize_dn if key == self._normalize_dn else str
+                if {replace_key(v) for v in present} != {replace_key(v) for v in values}:
+                    changes.setdefault(attribute, []).append((ldap3.MODIFY_REPLACE, values))
+            elif operation == "add":
+                values = [v for v in values if (key or str)(v) not in present_keys]
+                if values:
+                    changes.setdefault(attribute, []).append((ldap3.MODIFY_ADD, values))
+            elif present:
+                # an empty delete list deletes all values
+                if values and key:
+                    values = [v for v in values if key(v) in present_keys]
+                    if values:
+                        changes.setdefault(attribute, []).append((ldap3.MODIFY_DELETE, values))
+                else:
+                    changes.setdefault(attribute, []).append((ldap3.MODIFY_DELETE, values))
+
+        skipped = list(dict.fromkeys(attribute for attribute, _, _ in operations if attribute not in changes))
+        return changes, skipped
+
+    def _handle_set_attributes(self, param):
+        """
+        Applies a JSON change set of attribute operations to one or
+        more objects. The current values are read in batched
+        searches first, operations that would not change anything
+        are dropped, and each object gets at most one modify
+        (pipelined if enabled) with all of its remaining changes.
+        """
         action_result = self.add_action_result(ActionResult(dict(param)))
+        self.save_progress(f"In action handler for: {self.get_action_identifier()}")
         summary = action_result.update_summary({})
 
-        ar_data = {}
-        user = param["object"].lower()
-        new_name = param["new_name"]
+        try:
+            change_set = self._parse_change_set(param["changes"])
+        except ValueError as e:
+            return action_result.set_status(phantom.APP_ERROR, f"Please provide a valid change set in the 'changes' parameter: {e!s}")
 
         if not self._ldap_bind(action_result):
-            action_result.add_data({"message": "Failed"})
-            summary["message"] = "Failed"
             return action_result.get_status()
 
-        if param.get("use_samaccountname", False):
-            ret_val, user_dn = self._sam_to_dn([user], action_result=action_result)
+        objects = list(change_set)
+        ret_val, targets = self._resolve_targets(action_result, objects, param.get("use_samaccountname", False))
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        attributes = {attribute.lower(): attribute for operations in change_set.values() for attribute, _, _ in operations}
+        ret_val, current = self._get_current_values(action_result, [t["user_dn"] for t in targets if "user_dn" in t], list(attributes.values()))
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        missing = [i for i, t in enumerate(targets) if "user_dn" in t and self._normalize_dn(t["user_dn"]) not in current]
+        ret_val, refreshed = self._refresh_stale_targets(action_result, targets, missing)
+        if refreshed:
+            ret_val, refreshed_values = self._get_current_values(
+                action_result, [targets[i]["user_dn"] for i in refreshed], list(attributes.values())
+            )
             if phantom.is_fail(ret_val):
                 return action_result.get_status()
+            current.update(refreshed_values)
+
+        failed = {}
+        operations = []
+        pending = []
+        for i, (obj, ar_data) in enumerate(zip(objects, targets)):
+            ar_data["modified"] = False
+            values = current.get(self._normalize_dn(ar_data["user_dn"])) if "user_dn" in ar_data else None
+            if values is None:
+                failed[i] = "No object found"
+                continue
+
+            changes, skipped = self._get_effective_changes(change_set[obj], values)
+            ar_data["changed_attributes"] = list(changes)
+            ar_data["unchanged_attributes"] = skipped
+            if changes:
+                # adding a value that differs only in case is not an error either
+                operations.append(("modify", (ar_data["user_dn"], changes, [PERMISSIVE_MODIFY_CONTROL])))
+                pending.append(i)
+
+        for i, (success, error) in zip(pending, self._run_operations(operations)):
+            ar_data = targets[i]
+            if not success:
+                self.debug_print(f"set_attributes error = {error}")
+                failed[i] = error
+                continue
+
+            ar_data["modified"] = True
+            changed = {attribute.lower() for attribute in ar_data["changed_attributes"]}
+            if "samaccountname" in changed:
+                self._sam_cache_invalidate(ar_data["user_dn"])
+            if "member" in changed:
+                members = [v for attribute, _, values in change_set[objects[i]] if attribute.lower() == "member" for v in values]
+                self._group_cache_invalidate([ar_data["user_dn"], *members])
+
+        summary["total_objects"] = len(targets)
+        summary["modified"] = len([t for t in targets if t["modified"]])
+        summary["unchanged_attributes"] = sum(len(t.get("unchanged_attributes", [])) for t in targets)
+        return self._set_bulk_status(action_result, targets, failed, noun="object")
 
-            if not user_dn or user_dn.get(user) is False:
-                action_result.add_data({"message": "Failed"})
-                summary["message"] = "Failed"
-                return action_result.set_status(phantom.APP_ERROR, "No users found")
+    def _handle_rename_object(self, param):
+        """
+        Renames one or more objects, each to the new name at the
+        same position in 'new_name'. sAMAccountNames are resolved
+        in one batch and the renames are pipelined if enabled.
+        """
+        action_result = self.add_action_result(ActionResult(dict(param)))
+        summary = action_result.update_summary({})
 
-            ar_data["user_dn"] = user_dn[user]
-            ar_data["samaccountname"] = user
-            user = user_dn[user]
-        else:
-            ar_data["user_dn"] = user
+        use_samaccountname = param.get("use_samaccountname", False)
+        objects = [i.strip().lower() if use_samaccountname else i.strip() for i in param["object"].split(";") if i.strip()]
+        new_names = [i.strip() for i in param["new_name"].split(";") if i.strip()]
+        if len(new_names) != len(objects):
+            return action_result.set_status(phantom.APP_ERROR, "Please provide one 'new_name' per object")
 
-        try:
-            self.debug_print(f"rename distinguishedName {user} to {new_name} ")
-            ret = self._ldap_connection.modify_dn(ar_data["user_dn"], new_name)
-            self.debug_print(f"handle_rename_object, ret = {ret}")
-        except Exception as e:
-            self._dump_error_log(e)
+        if not self._ldap_bind(action_result):
             action_result.add_data({"message": "Failed"})
             summary["message"] = "Failed"
-            return action_result.set_status(phantom.APP_ERROR, str(e))
+            return action_result.get_status()
 
-        action_result.add_data({"message": ("Success" if ret else "Failed")})
-        action_result.set_status(ret)
-        summary["summary"] = "Successfully Renamed Object"
-        self.debug_print(f"resp = {self._ldap_connection.response_to_json()}")
-        return action_result.set_status(phantom.APP_SUCCESS)
+        # new DNs are built from the source DN, so keep it as the server returned it
+        ret_val, targets = self._resolve_targets(action_result, objects, use_samaccountname, keep_case=True)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        failed = {}
+        requests = []
+        for i, (ar_data, new_name) in enumerate(zip(targets, new_names)):
+            if "user_dn" not in ar_data:
+                failed[i] = "No users found"
+                continue
+            self.debug_print(f"rename distinguishedName {ar_data['user_dn']} to {new_name}")
+            requests.append((i, new_name, None))
+
+        failed.update(self._modify_dns(action_result, targets, requests))
+        for i, ar_data in enumerate(targets):
+            if i not in failed:
+                ar_data["message"] = "Success"
+
+        summary["total_objects"] = len(targets)
+        if not failed:
+            summary["summary"] = "Successfully Renamed Object"
+        return self._set_bulk_status(action_result, targets, failed, noun="object")
+
+    def _to_json_value(self, value):
+        """
+        Converts an ldap3 attribute value into the plain value that
+        serializing it with format_json and parsing it back would
+        give, without going through text.
+        """
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return [self._to_json_value(i) for i in value]
+        if isinstance(value, dict):
+            return {str(k): self._to_json_value(v) for k, v in value.items()}
+        return self._to_json_value(format_json(value))
+
+    def _entry_to_dict(self, entry):
+        """
+        Converts a single searchResEntry into the same
+        {"dn": ..., "attributes": {...}} shape that
+        response_to_json() produces for each entry.
+        """
+        attributes = entry["attributes"]
+        return {"attributes": {k: self._to_json_value(attributes[k]) for k in sorted(attributes)}, "dn": entry["dn"]}
 
-    def _query(self, action_result, param):
+    def _iter_attribute_range(self, dn, attribute, values, high):
+        """
+        yields (high, values) for each ";range=" chunk of a large
+        multi-valued attribute, starting with the chunk the server
+        already returned and fetching the next ones on demand, so a
+        consumer can stop (or write chunks out) at any point.
+        """
+        yield high, values
+        while high != "*":
+            # with empty attributes on, ldap3 deletes the plain attribute of
+            # a ranged one, which a ";range=" request never has (KeyError)
+            self._ldap_connection.empty_attributes = False
+            try:
+                self._ldap_connection.search(
+                    search_base=dn,
+                    search_filter="(objectclass=*)",
+                    search_scope=ldap3.BASE,
+                    attributes=[f"{attribute};range={int(high) + 1}-*"],
+                    time_limit=self._operation_timeout,
+                )
+            finally:
+                self._ldap_connection.empty_attributes = True
+            attributes = next((r["attributes"] for r in self._ldap_connection.response if r["type"] == "searchResEntry"), {})
+            key = next((k for k in attributes if k.lower().startswith(f"{attribute.lower()};range=")), None)
+            if key is None:
+                return
+            high = key.partition(";range=")[2].partition("-")[2]
+            yield high, attributes[key]
+
+    def _iter_range_values(self, dn, attribute, values, high, max_values, counts):
         """
-        This method handles the query and returns
-        the response in the ldap connection object
-        as json.
+        yields the values of a large multi-valued attribute one
+        ";range=" chunk at a time (see _iter_attribute_range) and
+        stops at max_values (0 = unlimited), counting the attribute
+        in counts["capped_attributes"] if it was cut there.
+        """
+        total = 0
+        for high, chunk in self._iter_attribute_range(dn, attribute, values, high):
+            if max_values and total + len(chunk) >= max_values:
+                if total + len(chunk) > max_values or high != "*":
+                    counts["capped_attributes"] += 1
+                yield self._to_json_value(chunk[: max_values - total])
+                return
+            total += len(chunk)
+            yield self._to_json_value(chunk)
+
+    def _expand_ranged_attributes(self, entry, counts, max_values=0, stream=False):
+        """
+        stitches the ";range=" chunks of large multi-valued
+        attributes (e.g. member;range=0-1499) of a searchResEntry
+        back under the plain attribute name.
+
+        max_values (0 = unlimited) caps the number of values kept
+        per attribute, no further chunks are requested once it is
+        reached. Capped attributes are counted in
+        counts["capped_attributes"].
+
+        With stream set the attributes are taken out of the entry
+        instead and returned as a dict of attribute -> iterator
+        over the value chunks, which fetches each next range only
+        when it is consumed (see QueryResultWriter).
+        """
+        ranges = {}
+        attributes = entry["attributes"]
+        for key in [k for k in attributes if ";range=" in k]:
+            attribute, _, returned_range = key.partition(";range=")
+            chunks = self._iter_range_values(entry["dn"], attribute, attributes.pop(key), returned_range.partition("-")[2], max_values, counts)
+            if stream:
+                ranges[attribute] = chunks
+            else:
+                attributes[attribute] = [value for chunk in chunks for value in chunk]
 
-        Returns the data or throws and exception.
+        return ranges
+
+    @timed("query")
+    def _paged_query(self, action_result, param, page_size=DEFAULT_PAGE_SIZE, max_results=0, max_values=0, entries=None, controls=None):
+        """
+        This method handles the query using the Simple Paged
+        Results control. Entries are consumed from a generator
+        and converted page by page, so the full result set is never
+        held in the ldap connection object.
+
+        Returns a tuple of (status, data) where data is a dict with
+        an "entries" list, plus a "truncated" flag that is set when
+        max_results (0 = unlimited) stopped the search early and the
+        number of "capped_attributes" that were cut at max_values
+        (see _expand_ranged_attributes). If entries has a true
+        "stream_ranges" attribute, the entries it gets carry their
+        ranged attributes as a "ranges" dict of value chunk iterators.
         param must include:
             - attributes (to retrieve - semi-colon separated string:
                 e.g. "mail;samaccountname;pwdlastset")
             - filter (ldap query)
+        and may include a search_base. entries may be
+        any list-like sink (e.g. a QueryResultWriter) to collect the
+        entries in instead of a new list. controls are sent along
+        with every page request.
         """
         attrs = [i.strip() for i in param["attributes"].split(";")]
         filter = param["filter"]
         search_base = param.get("search_base", self._get_root_dn())
+        out_data = {"entries": [] if entries is None else entries, "truncated": False, "capped_attributes": 0}
+        # a sink that can write ranged attributes one range at a time gets them unexpanded
+        stream = getattr(out_data["entries"], "stream_ranges", False)
 
-        try:
-            # throw exception if we cannot bind
-            if not self._ldap_bind(action_result):
-                return action_result.get_status(), {}
+        attempt = 0
+        while True:
+            try:
+                # throw exception if we cannot bind
+                if not self._ldap_bind(action_result):
+                    return action_result.get_status(), out_data
+
+                entries = self._ldap_connection.extend.standard.paged_search(
+                    search_base=search_base,
+                    search_filter=filter,
+                    search_scope=ldap3.SUBTREE,
+                    attributes=attrs,
+                    time_limit=self._operation_timeout,
+                    controls=controls,
+                    paged_size=page_size,
+                    generator=True,
+                )
+                for entry in entries:
+                    if entry["type"] != "searchResEntry":
+                        continue
+                    if max_results and len(out_data["entries"]) >= max_results:
+                        out_data["truncated"] = True
+                        break
+                    ranges = self._expand_ranged_attributes(entry, out_data, max_values, stream=stream)
+                    entry = self._entry_to_dict(entry)
+                    if ranges:
+                        entry["ranges"] = ranges
+                    out_data["entries"].append(entry)
+                break
+            except Exception as e:
+                if isinstance(e, TRANSIENT_LDAP_ERRORS) and attempt < self._max_retries:
+                    # searches are safe to repeat, start over on a fresh connection
+                    delay = self._get_retry_delay(attempt)
+                    attempt += 1
+                    self.debug_print(f"paged_query, transient error: {e!s}, retry {attempt} of {self._max_retries} in {delay:.2f}s")
+                    time.sleep(delay)
+                    out_data["entries"].clear()
+                    out_data["truncated"] = False
+                    out_data["capped_attributes"] = 0
+                    try:
+                        self._ldap_connection.unbind()
+                    except Exception:
+                        pass
+                    continue
+
+                self._dump_error_log(e)
+                self.debug_print(f"{e!s}")
+                return action_result.set_status(phantom.APP_ERROR, self._get_error_message(e)), out_data
+
+        return action_result.set_status(phantom.APP_SUCCESS), out_data
+
+    def _get_paging_params(self, action_result, param):
+        """
+        returns (status, page_size, max_results, max_values) from
+        the optional paging parameters of run query / get attributes.
+        """
+        ret_val, page_size = self._validate_integer(action_result, param.get("page_size", DEFAULT_PAGE_SIZE), "page_size")
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), None, None, None
 
-            self._ldap_connection.search(search_base=search_base, search_filter=filter, search_scope=ldap3.SUBTREE, attributes=attrs)
-        except Exception as e:
-            self._dump_error_log(e)
-            self.debug_print(f"{e!s}")
-            return action_result.set_status(phantom.APP_ERROR, str(e)), {}
+        ret_val, max_results = self._validate_integer(action_result, param.get("max_results", 0), "max_results", allow_zero=True)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), None, None, None
 
-        return action_result.set_status(phantom.APP_SUCCESS), self._ldap_connection.response_to_json()
+        ret_val, max_values = self._validate_integer(
+            action_result, param.get("max_attribute_values", 0), "max_attribute_values", allow_zero=True
+        )
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), None, None, None
+
+        return phantom.APP_SUCCESS, page_size, max_results, max_values
 
     def _handle_run_query(self, param):
         """
@@ -577,22 +2564,459 @@ class AdLdapConnector(BaseConnector):
 
         summary = action_result.update_summary({})
 
-        ret_val, resp = self._query(action_result, param)
+        ret_val, page_size, max_results, max_values = self._get_paging_params(action_result, param)
         if phantom.is_fail(ret_val):
             return action_result.get_status()
 
-        # unify the attributes returned from AD to lowercase keys
-        out_data = json.loads(resp)
-        for i, _ in enumerate(out_data["entries"]):
-            out_data["entries"][i]["attributes"] = {k.lower(): v for k, v in list(out_data["entries"][i]["attributes"].items())}
+        output_mode = param.get("output_mode", "inline").lower()
+        if output_mode not in OUTPUT_MODES:
+            return action_result.set_status(phantom.APP_ERROR, f"Please provide one of {', '.join(OUTPUT_MODES)} in the 'output_mode' parameter")
+
+        if output_mode != "inline":
+            ret_val, out_data = self._export_query_results(
+                action_result, param, output_mode, page_size=page_size, max_results=max_results, max_values=max_values
+            )
+            if phantom.is_fail(ret_val):
+                return action_result.get_status()
+            summary["vault_id"] = out_data["vault_id"]
+        else:
+            now = time.time()
+            out_data = None
+            if self._query_cache_ttl:
+                search_base = param.get("search_base", self._get_root_dn())
+                cache_key = self._get_query_cache_key(param, search_base, max_results, max_values)
+                out_data = self._query_cache_lookup(cache_key, now)
+            summary["cached"] = out_data is not None
+
+            if out_data is None:
+                ret_val, out_data = self._paged_query(action_result, param, page_size=page_size, max_results=max_results, max_values=max_values)
+                if phantom.is_fail(ret_val):
+                    return action_result.get_status()
+
+                # unify the attributes returned from AD to lowercase keys
+                for entry in out_data["entries"]:
+                    entry["attributes"] = {k.lower(): v for k, v in list(entry["attributes"].items())}
+                if self._query_cache_ttl:
+                    self._query_cache_store(cache_key, search_base, out_data, now)
+            summary["total_objects"] = len(out_data["entries"])
 
         # set data path stuff and exit
+        summary["truncated"] = out_data.pop("truncated")
+        summary["capped_attributes"] = out_data.pop("capped_attributes")
         action_result.add_data(out_data)
-        summary["total_objects"] = len(self._get_filtered_response())
+        return action_result.set_status(phantom.APP_SUCCESS)
+
+    def _export_query_results(self, action_result, param, output_mode, **kwargs):
+        """
+        streams the entries of a run query into a gzip compressed
+        JSONL or CSV file in the vault as the pages arrive.
+
+        Returns a tuple of (status, data) where data only holds a
+        sample of the entries and the vault details, the total
+        number of entries is added to the summary.
+        """
+        columns = ["dn"] + [i.strip().lower() for i in param["attributes"].split(";") if i.strip()]
+        if output_mode == "csv" and any("*" in i for i in columns):
+            return action_result.set_status(phantom.APP_ERROR, "The csv output mode requires the attributes to be listed explicitly"), None
+
+        fd, path = tempfile.mkstemp(dir=Vault.get_vault_tmp_dir(), suffix=f".{output_mode}.gz")
+        os.close(fd)
+        writer = QueryResultWriter(path, output_mode, columns)
+        try:
+            ret_val, out_data = self._paged_query(action_result, param, entries=writer, **kwargs)
+            writer.close()
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), None
+
+            action_result.update_summary({"total_objects": len(writer)})
+            file_name = "run_query_{}.{}.gz".format(time.strftime("%Y%m%d%H%M%S"), output_mode)
+            success, message, vault_id = ph_rules.vault_add(container=self.get_container_id(), file_location=path, file_name=file_name)
+            if not success:
+                return action_result.set_status(phantom.APP_ERROR, f"Unable to add the results to the vault: {message}"), None
+        finally:
+            writer.close()
+            if os.path.exists(path):
+                os.remove(path)
+
+        out_data.update({"entries": writer.sample, "vault_id": vault_id, "file_name": file_name})
+        return phantom.APP_SUCCESS, out_data
+
+    def _get_change_tracking_key(self, param, method):
+        """
+        returns the state key of a tracked query, so each distinct
+        combination of method, search base, filter and attributes
+        keeps its own high-water mark.
+        """
+        query = [method, param.get("search_base", "").lower(), param["filter"], param["attributes"].lower()]
+        return hashlib.sha256(json.dumps(query).encode()).hexdigest()
+
+    def _get_highest_committed_usn(self):
+        """
+        returns the current highestCommittedUSN of the bound
+        domain controller, read from the root DSE.
+        """
+        self._ldap_connection.search(
+            search_base="",
+            search_filter="(objectclass=*)",
+            search_scope=ldap3.BASE,
+            attributes=["highestCommittedUSN"],
+            time_limit=self._operation_timeout,
+        )
+        entry = next(r for r in self._ldap_connection.response if r["type"] == "searchResEntry")
+        return int(entry["raw_attributes"]["highestCommittedUSN"][0])
+
+    def _get_usn_changes(self, action_result, param, mark):
+        """
+        returns a tuple of status, the changed entries and the new
+        high-water marks, searching for uSNChanged above the previous
+        mark. uSNs are local to a domain controller, so one mark is
+        kept per server and only a server that was never seen before
+        starts with a full sync. A run fails if a retry of a search
+        moved it to another server.
+        """
+        server = self._ldap_connection.server.host
+        usns = dict((mark or {}).get("usns", {}))
+        if mark and "usn" in mark:
+            # a mark from before the marks were kept per server
+            usns.setdefault(mark["server"], mark["usn"])
+        previous = usns.get(server)
+
+        # take the new mark before searching, so changes made during the search are picked up next time
+        try:
+            usn = self._get_highest_committed_usn()
+        except Exception as e:
+            self._dump_error_log(e)
+            return action_result.set_status(phantom.APP_ERROR, self._get_error_message(e)), None, None
+
+        query = {
+            "filter": param["filter"] if previous is None else f"(&(usnchanged>={previous + 1}){param['filter']})",
+            "attributes": f"{param['attributes']};usncreated;usnchanged",
+        }
+        if param.get("search_base"):
+            query["search_base"] = param["search_base"]
+        ret_val, resp = self._paged_query(action_result, query)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), None, None
+        if self._ldap_connection.server.host != server:
+            return action_result.set_status(phantom.APP_ERROR, ADLDAP_USN_SERVER_CHANGED_MSG.format(server=server)), None, None
+
+        changes = []
+        for entry in resp["entries"]:
+            attributes = {k.lower(): v for k, v in entry["attributes"].items()}
+            added = previous is None or int(attributes.get("usncreated") or 0) > previous
+            changes.append({"dn": entry["dn"], "change_type": "added" if added else "modified", "attributes": attributes})
+
+        if previous is not None:
+            # deleted objects no longer match the filter, report the tombstones whose last parent was under the
+            # search base. Tombstones keep their objectClass, so the object classes of the filter still apply
+            search_base = self._normalize_dn(param.get("search_base") or self._get_root_dn())
+            classes = self._get_filter_object_classes(param["filter"])
+            class_filter = "(|{})".format("".join(f"(objectclass={escape_filter_chars(c)})" for c in classes)) if classes else ""
+            ret_val, resp = self._paged_query(
+                action_result,
+                {
+                    "filter": f"(&(isdeleted=TRUE)(usnchanged>={previous + 1}){class_filter})",
+                    "attributes": "lastknownparent;samaccountname;objectclass",
+                },
+                controls=[show_deleted_control()],
+            )
+            if phantom.is_fail(ret_val):
+                return action_result.get_status(), None, None
+            if self._ldap_connection.server.host != server:
+                return action_result.set_status(phantom.APP_ERROR, ADLDAP_USN_SERVER_CHANGED_MSG.format(server=server)), None, None
+
+            for entry in resp["entries"]:
+                attributes = {k.lower(): v for k, v in entry["attributes"].items()}
+                parent = self._normalize_dn(attributes.get("lastknownparent") or "")
+                if parent == search_base or parent.endswith("," + search_base):
+                    changes.append({"dn": entry["dn"], "change_type": "deleted", "attributes": attributes})
+
+        usns[server] = usn
+        return phantom.APP_SUCCESS, changes, {"usns": usns, "initial": previous is None}
+
+    def _get_filter_object_classes(self, filter):
+        """
+        returns the object classes the filter asks for with
+        (objectClass=...) equality terms that are not negated,
+        other than top, e.g. ["user"] for
+        (&(objectClass=user)(adminCount=1)).
+        """
+        classes = re.findall(r"(?<!\(!)\(\s*objectclass\s*=\s*([^()*]+?)\s*\)", filter, re.IGNORECASE)
+        return list(dict.fromkeys(c.lower() for c in classes if c.lower() != "top"))
+
+    def _get_dirsync_changes(self, action_result, param, mark):
+        """
+        returns a tuple of status, the changed entries and the new
+        DirSync cookie. Needs the 'Replicating Directory Changes'
+        permission and a naming context root as the search base.
+        DirSync does not tell new objects apart, after the first run
+        they are reported as modified.
+        """
+        cookie = base64.b64decode(mark["cookie"]) if mark and mark.get("cookie") else None
+        attributes = [i.strip() for i in param["attributes"].split(";")] + ["isDeleted"]
+
+        changes = []
+        try:
+            sync = self._ldap_connection.extend.microsoft.dir_sync(
+                sync_base=param.get("search_base") or self._get_root_dn(),
+                sync_filter=param["filter"],
+                attributes=attributes,
+                cookie=cookie,
+                incremental_values=False,
+            )
+            while sync.more_results:
+                for entry in sync.loop():
+                    if entry["type"] != "searchResEntry":
+                        continue
+                    entry = self._entry_to_dict(entry)
+                    attributes = {k.lower(): v for k, v in entry["attributes"].items()}
+                    # strip the <GUID=...>;<SID=...>; prefix of the extended DN
+                    dn = entry["dn"].rsplit(">;", 1)[-1]
+                    change_type = "deleted" if attributes.get("isdeleted") is True else "added" if cookie is None else "modified"
+                    changes.append({"dn": dn, "change_type": change_type, "attributes": attributes})
+        except Exception as e:
+            self._dump_error_log(e)
+            return action_result.set_status(phantom.APP_ERROR, self._get_error_message(e)), None, None
+
+        return phantom.APP_SUCCESS, changes, {"cookie": base64.b64encode(sync.cookie).decode()}
+
+    def _handle_get_changes(self, param):
+        """
+        returns the objects matching the filter that were added,
+        modified or deleted since the previous run of the same
+        query, tracked with a uSNChanged high-water mark or a
+        DirSync cookie stored in the state file.
+
+        The first run (or a run with reset) returns every matching
+        object as added and records the starting point.
+        """
+        action_result = self.add_action_result(ActionResult(dict(param)))
+        summary = action_result.update_summary({})
+
+        method = param.get("method", "usnchanged").lower()
+        if method not in CHANGE_TRACKING_METHODS:
+            return action_result.set_status(
+                phantom.APP_ERROR, f"Please provide one of {', '.join(CHANGE_TRACKING_METHODS)} in the 'method' parameter"
+            )
+
+        if not self._ldap_bind(action_result):
+            return action_result.get_status()
+
+        tracking = self._state.setdefault("change_tracking", {})
+        key = self._get_change_tracking_key(param, method)
+        mark = None if param.get("reset", False) else tracking.get(key)
+
+        if method == "dirsync":
+            ret_val, changes, new_mark = self._get_dirsync_changes(action_result, param, mark)
+        else:
+            ret_val, changes, new_mark = self._get_usn_changes(action_result, param, mark)
+        if phantom.is_fail(ret_val):
+            return action_result.get_status()
+
+        # a domain controller without a uSNChanged mark of its own starts over as well
+        initial = new_mark.pop("initial", mark is None)
+        new_mark["timestamp"] = time.time()
+        tracking[key] = new_mark
+
+        counts = collections.Counter(change["change_type"] for change in changes)
+        for change in changes:
+            action_result.add_data(change)
+
+        summary["method"] = method
+        summary["initial_sync"] = initial
+        summary["total_objects"] = len(changes)
+        summary.update({change_type: counts[change_type] for change_type in ("added", "modified", "deleted")})
+        return action_result.set_status(phantom.APP_SUCCESS)
+
+    def _iter_vault_rows(self, path):
+        """
+        yields one (row, error) tuple per row of a CSV or JSONL
+        file, which may be gzip compressed, reading it line by line
+        so large files are never loaded whole. row is a dict with
+        lowercase keys, or None with an error message for a row
+        that cannot be parsed. A file whose first line starts with
+        "{" or "[" is JSONL, and every line must be a JSON object.
+        """
+        with open(path, "rb") as f:
+            gzipped = f.read(2) == b"\x1f\x8b"
+
+        with (gzip.open if gzipped else open)(path, "rt", encoding="utf-8-sig", newline="") as f:
+            first = next((line for line in f if line.strip()), None)
+            if first is None:
+                return
+
+            if first.lstrip().startswith(("{", "[")):
+                for line in itertools.chain([first], f):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        yield None, f"Invalid JSON: {e!s}"
+                        continue
+                    if not isinstance(row, dict):
+                        yield None, "Invalid row: not a JSON object"
+                        continue
+                    yield {str(k).strip().lower(): v for k, v in row.items()}, None
+                return
+
+            rows = csv.DictReader(itertools.chain([first], f))
+            # without a header no row can be read, so an error there is an error of the file
+            if not rows.fieldnames:
+                return
+            while True:
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    # the reader has consumed the bad line and continues with the next one
+                    yield None, f"Invalid CSV row: {e!s}"
+                    continue
+                yield {str(k).strip().lower(): v for k, v in row.items()}, None
+
+    def _apply_password_rows(self, action_result, param, rows, key):
+        """
+        resolves the users of a chunk of password file rows, the
+        (row, error) tuples of _iter_vault_rows, in one batch and
+        sends their modifies (pipelined if enabled). Returns a tuple
+        of status and one result dict per row, which never includes
+        the password. Rows with an error are failed rows.
+        """
+        users = [str(row.get("user") or "").strip().lower() if row else "" for row, _ in rows]
+        names = list(dict.fromkeys(user for user in users if user))
+        ret_val, targets = self._resolve_targets(action_result, names, param.get("use_samaccountname", False))
+        if phantom.is_fail(ret_val):
+            return action_result.get_status(), []
+        index = {name: i for i, name in enumerate(names)}
+
+        def modify(changes):
+            return lambda dn: ("modify", (dn, changes))
+
+        outcomes = []
+        pending = []
+        pending_outcomes = []
+        for (row, error), user in zip(rows, users):
+            ar_data = {"user": user, key: False}
+            outcomes.append(ar_data)
+            if error:
+                ar_data["message"] = error
+                continue
+            if user not in index or "user_dn" not in targets[index[user]]:
+                ar_data["message"] = "No users found"
+                continue
+
+            if key == "set":
+                password = row.get("password") or param.get("password")
+                if not password:
+                    ar_data["user_dn"] = targets[index[user]]["user_dn"]
+                    ar_data["message"] = "No password for this user"
+                    continue
+                # same change as ldap3.extend.microsoft.modifyPassword.ad_modify_password, so it can be pipelined
+                changes = {"unicodePwd": [(ldap3.MODIFY_REPLACE, [f'"{password}"'.encode("utf-16-le")])]}
+            else:
+                changes = {"pwdLastSet": [(ldap3.MODIFY_REPLACE, ["0"])]}
+            pending.append((index[user], modify(changes)))
+            pending_outcomes.append(ar_data)
+
+        for ar_data, (i, _), (success, error) in zip(pending_outcomes, pending, self._run_target_operations(action_result, targets, pending)):
+            ar_data["user_dn"] = targets[i].get("user_dn")
+            ar_data[key] = success
+            if not success:
+                ar_data["message"] = error
+
+        return phantom.APP_SUCCESS, outcomes
+
+    def _handle_password_file(self, action_result, param, key):
+        """
+        Resets (key "reset") or sets (key "set") the passwords of
+        the users in a CSV or JSONL vault file with a 'user' and
+        an optional 'password' column. The file is streamed in
+        chunks of sam_batch_size rows over the bound session, and
+        a gzip compressed JSONL file with the result of every row
+        is added to the vault. Passwords are never part of the
+        action data or the result file.
+        """
+        summary = action_result.update_summary({})
+        try:
+            success, message, info = ph_rules.vault_info(vault_id=param["vault_id"])
+            path = info[0]["path"] if success and info else None
+        except Exception as e:
+            self._dump_error_log(e)
+            success, message, path = False, str(e), None
+        if not path:
+            return action_result.set_status(phantom.APP_ERROR, f"Unable to find the file in the vault: {message}")
+
+        if not self._ldap_bind(action_result):
+            return action_result.get_status()
+
+        counts = {"total_objects": 0, "succeeded": 0, "failed": 0}
+        error = None
+        fd, result_path = tempfile.mkstemp(dir=Vault.get_vault_tmp_dir(), suffix=".jsonl.gz")
+        os.close(fd)
+        try:
+            with gzip.open(result_path, "wt", encoding="utf-8") as results:
+                rows = self._iter_vault_rows(path)
+                while not error:
+                    chunk = []
+                    try:
+                        for row in rows:
+                            chunk.append(row)
+                            if len(chunk) >= self._sam_batch_size:
+                                break
+                    except (csv.Error, UnicodeDecodeError, OSError, EOFError) as e:
+                        # the rest of the file cannot be read, the rows read before still run and are reported
+                        self._dump_error_log(e)
+                        error = f"Unable to read the file from the vault: {e!s}"
+                    if not chunk:
+                        break
+
+                    ret_val, outcomes = self._apply_password_rows(action_result, param, chunk, key)
+                    if phantom.is_fail(ret_val):
+                        error = action_result.get_message()
+                        break
+
+                    for ar_data in outcomes:
+                        counts["total_objects"] += 1
+                        counts["succeeded" if ar_data[key] else "failed"] += 1
+                        results.write(json.dumps(dict(ar_data, row=counts["total_objects"])) + "\n")
+                    self.send_progress(f"Processed {counts['total_objects']} users")
+
+            summary.update(counts)
+            if error and not counts["total_objects"]:
+                return action_result.set_status(phantom.APP_ERROR, error)
+
+            # the rows that ran before an error are reported as well, their passwords have changed
+            file_name = "{}_{}.jsonl.gz".format(self.get_action_identifier(), time.strftime("%Y%m%d%H%M%S"))
+            success, message, vault_id = ph_rules.vault_add(container=self.get_container_id(), file_location=result_path, file_name=file_name)
+            if not success:
+                return action_result.set_status(phantom.APP_ERROR, f"Unable to add the results to the vault: {message}")
+        except OSError as e:
+            self._dump_error_log(e)
+            return action_result.set_status(phantom.APP_ERROR, f"Unable to write the result file: {e!s}")
+        finally:
+            if os.path.exists(result_path):
+                os.remove(result_path)
+
+        action_result.add_data({"vault_id": vault_id, "file_name": file_name})
+        summary["vault_id"] = vault_id
+        summary[key] = counts["total_objects"] > 0 and not counts["failed"] and not error
+        if error:
+            return action_result.set_status(
+                phantom.APP_ERROR,
+                f"{error}. Stopped after {counts['total_objects']} rows, the results of these rows are in the vault file {file_name}",
+            )
+        if counts["total_objects"] and counts["failed"] == counts["total_objects"]:
+            return action_result.set_status(phantom.APP_ERROR, f"Failed for all {counts['total_objects']} accounts")
         return action_result.set_status(phantom.APP_SUCCESS)
 
     def _handle_reset_password(self, param):
         action_result = self.add_action_result(ActionResult(dict(param)))
+        if param.get("vault_id"):
+            return self._handle_password_file(action_result, param, "reset")
+        if not param.get("user"):
+            return action_result.set_status(phantom.APP_ERROR, "Please provide a value in the 'user' or the 'vault_id' parameter")
+
         user = param["user"].lower()
         summary = action_result.update_summary({})
 
@@ -622,8 +3046,12 @@ class AdLdapConnector(BaseConnector):
 
         try:
             self.debug_print(f"mod_string = {changes}")
-            ret = self._ldap_connection.modify(dn=ar_data["user_dn"], changes=changes)
+            ret, ar_data["user_dn"] = self._modify_with_retry(
+                action_result, ar_data["user_dn"], lambda dn: self._ldap_connection.modify(dn=dn, changes=changes)
+            )
             self.debug_print(f"handle_reset_attribute, ret = {ret}")
+            if ret:
+                self._query_cache_invalidate([ar_data["user_dn"]])
         except Exception as e:
             self._dump_error_log(e)
             ar_data["reset"] = summary["reset"] = False
@@ -650,15 +3078,20 @@ class AdLdapConnector(BaseConnector):
         self.save_progress(f"In action handler for: {self.get_action_identifier()}")
         self.debug_print("handle_set_password")
 
-        user = param["user"].lower()
-        pwd = param["password"]
-        confirm_pwd = param["confirm_password"]
+        pwd = param.get("password")
+        confirm_pwd = param.get("confirm_password")
         ar_data = {}
         if pwd != confirm_pwd:
             ar_data["set"] = summary["set"] = False
             action_result.add_data(ar_data)
             return action_result.set_status(phantom.APP_ERROR, "Passwords do not match")
 
+        if param.get("vault_id"):
+            return self._handle_password_file(action_result, param, "set")
+        if not param.get("user") or not pwd:
+            return action_result.set_status(phantom.APP_ERROR, "Please provide a 'user' and a 'password', or a 'vault_id'")
+        user = param["user"].lower()
+
         if not self._ldap_bind(action_result):
             self.debug_print("handle_set_password - no bind")
             ar_data["set"] = summary["set"] = False
@@ -682,7 +3115,10 @@ class AdLdapConnector(BaseConnector):
 
         try:
             self.debug_print("about to attempt password set...")
-            ret = self._ldap_connection.extend.microsoft.modify_password(user, pwd)
+            ret, user = self._modify_with_retry(action_result, user, lambda dn: self._ldap_connection.extend.microsoft.modify_password(dn, pwd))
+            ar_data["user_dn"] = user
+            if ret:
+                self._query_cache_invalidate([user])
         except Exception as e:
             self._dump_error_log(e)
             self.debug_print(f"handle_set_password, e = {e!s}")
@@ -731,8 +3167,8 @@ class AdLdapConnector(BaseConnector):
         ret_val = phantom.APP_SUCCESS
 
         action_id = self.get_action_identifier()
-        self.debug_print(f"ADLDAPENV = {os.environ}")
         self.debug_print("action_id", self.get_action_identifier())
+        start = time.time()
 
         if action_id == "test_connectivity":
             ret_val = self._handle_test_connectivity(param)
@@ -772,6 +3208,20 @@ class AdLdapConnector(BaseConnector):
         elif action_id == "rename_object":
             ret_val = self._handle_rename_object(param)
 
+        elif action_id == "get_effective_membership":
+            ret_val = self._handle_get_effective_membership(param)
+
+        elif action_id == "get_changes":
+            ret_val = self._handle_get_changes(param)
+
+        elif action_id == "set_account_flag":
+            ret_val = self._handle_set_account_flag(param)
+
+        elif action_id == "set_attributes":
+            ret_val = self._handle_set_attributes(param)
+
+        self._report_timings(action_id, ret_val, time.time() - start)
+
         action_results = self.get_action_results()
         if len(action_results) > 0:
             action_result = action_results[-1]
@@ -792,17 +3242,58 @@ class AdLdapConnector(BaseConnector):
 
         # load our config for use.
         self._server = config["server"]
+        self._servers = list(dict.fromkeys(i.strip().lower() for i in self._server.replace(",", ";").split(";") if i.strip()))
+        self._server_pool_strategy = config.get("server_pool_strategy", "FIRST").upper()
+        self._server_health = self._state.setdefault("server_health", {})
         self._username = config["username"]
         self._password = config["password"]
         self._ssl = config["force_ssl"]
         self._validate_ssl_cert = config.get("validate_ssl_cert", False)
         self._ssl_port = int(config["ssl_port"])
+        # StartTLS upgrades a plain connection, with force_ssl the socket is already encrypted
+        self._use_starttls = config.get("use_starttls", False) and not self._ssl
+        self._metadata_cache_ttl = int(config.get("metadata_cache_ttl", DEFAULT_METADATA_CACHE_TTL))
+        self._sam_cache_ttl = int(config.get("sam_cache_ttl", DEFAULT_SAM_CACHE_TTL))
+        self._sam_cache_size = int(config.get("sam_cache_size", DEFAULT_SAM_CACHE_SIZE))
+        self._sam_batch_size = int(config.get("sam_batch_size", DEFAULT_SAM_BATCH_SIZE)) or DEFAULT_SAM_BATCH_SIZE
+        self._max_concurrency = int(config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+        self._connect_timeout = int(config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)) or None
+        self._receive_timeout = int(config.get("receive_timeout", DEFAULT_RECEIVE_TIMEOUT)) or None
+        self._operation_timeout = int(config.get("operation_timeout", DEFAULT_OPERATION_TIMEOUT))
+        self._max_retries = int(config.get("max_retries", DEFAULT_MAX_RETRIES))
+        self._use_connection_broker = config.get("use_connection_broker", False)
+        self._collect_timings = config.get("collect_timings", False)
+        self._sam_cache = self._state.setdefault("sam_cache", {})
+        self._sam_cache_hits = {}
+        self._group_cache_ttl = int(config.get("group_cache_ttl", DEFAULT_GROUP_CACHE_TTL))
+        self._group_cache = self._state.setdefault("group_cache", {})
+        self._query_cache_ttl = int(config.get("query_cache_ttl", DEFAULT_QUERY_CACHE_TTL))
+        self._query_cache = None
+        self._query_cache_stored = {}
+        self._query_cache_accessed = {}
+        self._query_cache_invalidations = []
         self.connected = False
         self._ldap_connection = None
+        self._ldap_async_connection = None
+        self._tls = None
+        self._connect_timings = None
+        self._timings = PhaseTimings()
 
         return phantom.APP_SUCCESS
 
     def finalize(self):
+        # hands a brokered connection back to the pool right away
+        if isinstance(self._ldap_connection, BrokerConnection):
+            self._ldap_connection.unbind()
+
+        if self._ldap_async_connection is not None:
+            try:
+                self._ldap_async_connection.unbind()
+            except Exception as e:
+                self.debug_print(f"finalize, unable to unbind the pipelined connection: {e!s}")
+
+        self._save_query_cache()
+
         # Save the state, this data is saved across actions and app upgrades
         self.save_state(self._state)
         return phantom.APP_SUCCESS
@@ -14,3 +14,66 @@
 # and limitations under the License.
 
 DEFAULT_TIMEOUT = 30  # seconds
+DEFAULT_CONNECT_TIMEOUT = 10  # seconds
+DEFAULT_RECEIVE_TIMEOUT = 60  # seconds
+DEFAULT_OPERATION_TIMEOUT = 45  # seconds, kept below the receive timeout so the server gives up first
+DEFAULT_MAX_RETRIES = 2
+RETRY_BACKOFF_BASE = 0.5  # seconds
+DEFAULT_PAGE_SIZE = 1000  # matches the AD MaxPageSize default
+DEFAULT_METADATA_CACHE_TTL = 86400  # seconds
+DEFAULT_SAM_CACHE_TTL = 3600  # seconds
+DEFAULT_SAM_CACHE_SIZE = 10000  # entries
+SAM_NEGATIVE_CACHE_TTL = 60  # seconds, upper bound for cached misses
+DEFAULT_SAM_BATCH_SIZE = 500  # names per sAMAccountName search filter
+DEFAULT_GROUP_CACHE_TTL = 900  # seconds
+GROUP_CACHE_SIZE = 5000  # entries
+DEFAULT_QUERY_CACHE_TTL = 0  # seconds, the run query result cache is opt-in
+QUERY_CACHE_SIZE = 20 * 1024 * 1024  # bytes of cached run query results
+QUERY_CACHE_FILE = "query_cache.json"  # per asset run query result cache in the state dir
+DEFAULT_MAX_CONCURRENCY = 1  # LDAP write operations in flight, 1 = no pipelining
+SERVER_RETRY_INTERVAL = 300  # seconds before a failed server is tried first again
+BROKER_POOL_SIZE = 4  # idle bound connections kept by the connection broker
+BROKER_IDLE_TIMEOUT = 900  # seconds without clients before the connection broker exits
+BROKER_HEALTH_CHECK_INTERVAL = 60  # seconds a pooled connection may sit idle before it is checked
+BROKER_START_TIMEOUT = 5  # seconds to wait for a new connection broker to accept clients
+EXPORT_SAMPLE_SIZE = 10  # entries kept inline when run query results go to the vault
+OUTPUT_MODES = ("inline", "jsonl", "csv")
+CHANGE_TRACKING_METHODS = ("usnchanged", "dirsync")
+CHANGE_SET_OPERATIONS = ("add", "delete", "replace")
+SID_REGEX = r"^S-1-\d+(-\d+)+$"
+GUID_REGEX = r"^\{?[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}\}?$"
+TIMINGS_LOG_FILE = "timings.jsonl"  # per asset JSON lines log of action timings in the state dir
+TIMINGS_LOG_MAX_SIZE = 10 * 1024 * 1024  # bytes before the timings log is rotated
+VIEW_PAGE_SIZE = 100  # entries rendered per action result in the attributes widget
+VIEW_MAX_VALUES = 20  # values shown for a multi-valued attribute in the widget
+VIEW_MAX_CELL_LENGTH = 1000  # characters shown for one attribute in the widget
+
+ADLDAP_VALID_INT_MSG = "Please provide a valid integer value in the '{param}' parameter"
+ADLDAP_NON_NEG_INT_MSG = "Please provide a valid non-negative integer value in the '{param}' parameter"
+ADLDAP_NON_NEG_NON_ZERO_INT_MSG = "Please provide a valid non-zero positive integer value in the '{param}' parameter"
+ADLDAP_TIMEOUT_ERR_MSG = "Timed out waiting for the LDAP server: {error}"
+ADLDAP_USN_SERVER_CHANGED_MSG = "The connection moved away from the domain controller {server} during the search, please run the action again"
+
+# LDAP_MATCHING_RULE_IN_CHAIN: walks the member/memberOf chain on the server
+LDAP_MATCHING_RULE_IN_CHAIN = "1.2.840.113556.1.4.1941"
+
+# LDAP_SERVER_PERMISSIVE_MODIFY_OID: adding an existing value or deleting a missing one is not an error
+PERMISSIVE_MODIFY_CONTROL = ("1.2.840.113556.1.4.1413", False, None)
+
+# LDAP syntaxes whose values the server compares as DNs or case-insensitively (AD Unicode and Teletex strings)
+DN_SYNTAX = "1.3.6.1.4.1.1466.115.121.1.12"
+CASE_IGNORE_SYNTAXES = ("1.3.6.1.4.1.1466.115.121.1.15", "1.2.840.113556.1.4.905")
+
+# userAccountControl flags that can be toggled through the directory
+UAC_FLAGS = {
+    "ACCOUNTDISABLE": 0x0002,
+    "PASSWD_NOTREQD": 0x0020,
+    "ENCRYPTED_TEXT_PWD_ALLOWED": 0x0080,
+    "DONT_EXPIRE_PASSWORD": 0x10000,
+    "SMARTCARD_REQUIRED": 0x40000,
+    "TRUSTED_FOR_DELEGATION": 0x80000,
+    "NOT_DELEGATED": 0x100000,
+    "USE_DES_KEY_ONLY": 0x200000,
+    "DONT_REQ_PREAUTH": 0x400000,
+    "TRUSTED_TO_AUTH_FOR_DELEGATION": 0x1000000,
+}
@@ -0,0 +1,96 @@
+# File: adldap_tls.py
+#
+# Copyright (c) 2021-2025 Splunk Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions
+# and limitations under the License.
+import ssl
+import time
+
+from ldap3 import Tls
+from ldap3.core.exceptions import LDAPSSLConfigurationError
+from ldap3.core.tls import check_hostname
+
+
+class CachedTls(Tls):
+    """
+    ldap3 Tls that builds its SSLContext once and reuses it for
+    every socket it wraps, instead of loading the CA bundle again
+    for each connection.
+
+    The TLS session of the last connection to each host is offered
+    when the next one is wrapped, so further connections made by
+    the same process (retries, the pipelined connection, the pool
+    of the connection broker) can resume it instead of doing a full
+    handshake. Handshake times are added up for instrumentation.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._context = None
+        self._sockets = {}
+        self._sessions = {}
+        self.handshake_time = 0.0
+        self.handshakes = 0
+        self.resumed = 0
+
+    def _get_context(self):
+        if self._context is None:
+            context = ssl.create_default_context(
+                purpose=ssl.Purpose.SERVER_AUTH, cafile=self.ca_certs_file, capath=self.ca_certs_path, cadata=self.ca_certs_data
+            )
+            if self.certificate_file:
+                context.load_cert_chain(self.certificate_file, keyfile=self.private_key_file, password=self.private_key_password)
+            context.check_hostname = False
+            context.verify_mode = self.validate
+            for option in self.ssl_options:
+                context.options |= option
+            if self.ciphers:
+                try:
+                    context.set_ciphers(self.ciphers)
+                except ssl.SSLError as e:
+                    raise LDAPSSLConfigurationError(f"invalid cipher list {self.ciphers!r}: {e}") from e
+            self._context = context
+        return self._context
+
+    def _get_session(self, host):
+        # TLS 1.3 tickets only arrive after the handshake, so pick them up from the open sockets
+        for known_host, sock in list(self._sockets.items()):
+            try:
+                session = sock.session
+            except Exception:
+                session = None
+            if session is not None:
+                self._sessions[known_host] = session
+        return self._sessions.get(host)
+
+    def wrap_socket(self, connection, do_handshake=False):
+        if self.version is not None:
+            return super().wrap_socket(connection, do_handshake)
+
+        host = connection.server.host
+        start = time.time()
+        wrapped_socket = self._get_context().wrap_socket(
+            connection.socket,
+            server_side=False,
+            do_handshake_on_connect=do_handshake,
+            server_hostname=self.sni,
+            session=self._get_session(host),
+        )
+        if do_handshake:
+            self.handshake_time += time.time() - start
+            self.handshakes += 1
+            self.resumed += wrapped_socket.session_reused
+            if self.validate in (ssl.CERT_REQUIRED, ssl.CERT_OPTIONAL):
+                check_hostname(wrapped_socket, host, self.valid_names)
+
+        self._sockets[host] = wrapped_socket
+        connection.socket = wrapped_socket
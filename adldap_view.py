@@ -12,7 +12,32 @@
 # the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
 # either express or implied. See the License for the specific language governing permissions
 # and limitations under the License.
+from adldap_consts import *
+
+
+def format_cell(value):
+    """
+    returns the text shown for an attribute value, cutting long
+    multi-valued attributes and long strings short so a single
+    huge cell cannot slow down the widget.
+    """
+    if isinstance(value, list):
+        text = ", ".join(str(v) for v in value[:VIEW_MAX_VALUES])
+        if len(value) > VIEW_MAX_VALUES:
+            text += f" ... ({len(value) - VIEW_MAX_VALUES} more)"
+    else:
+        text = str(value)
+
+    if len(text) > VIEW_MAX_CELL_LENGTH:
+        text = text[:VIEW_MAX_CELL_LENGTH] + "..."
+    return text
+
+
 def get_ctx_result(result):
+    """
+    returns the context of one action result. Only the first
+    VIEW_PAGE_SIZE entries are formatted for the template.
+    """
     ctx_result = {}
     param = result.get_param()
     summary = result.get_summary()
@@ -22,6 +47,12 @@ def get_ctx_result(result):
 
     if data:
         ctx_result["data"] = data[0]
+        entries = data[0].get("entries") or []
+        ctx_result["total_entries"] = len(entries)
+        ctx_result["entries"] = [
+            {"dn": entry.get("dn"), "attributes": [(k, format_cell(v)) for k, v in (entry.get("attributes") or {}).items()]}
+            for entry in entries[:VIEW_PAGE_SIZE]
+        ]
 
     if summary:
         ctx_result["summary"] = summary
@@ -31,23 +62,11 @@ def get_ctx_result(result):
 
 def display_attributes(provides, all_app_runs, context):
     context["results"] = results = []
-    context["attributes"] = []
-    print(f"DEBUG all_app_runs = {all_app_runs}")
     for summary, action_results in all_app_runs:
         for result in action_results:
             ctx_result = get_ctx_result(result)
             if not ctx_result:
                 continue
             results.append(ctx_result)
-    print(f"DEBUG ctx_result = {ctx_result}")
-
-    # populate keys into 'attributes' variable for django template
-    try:
-        for n in list(ctx_result["data"]["entries"][0]["attributes"].keys()):
-            if n not in context["attributes"]:
-                context["attributes"].append(n)
-    except Exception as e:
-        context["attributes"] = False
-        context["error"] = str(e)
 
     return "display_attributes.html"
@@ -0,0 +1,137 @@
+# File: directory.py
+#
+# Copyright (c) 2021-2025 Splunk Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions
+# and limitations under the License.
+import ldap3
+
+
+ROOT_DN = "DC=AD2012,DC=LAB"
+ADMIN_DN = f"CN=admin,CN=Users,{ROOT_DN}"
+ADMIN_PASSWORD = "benchmark"
+
+
+class Directory:
+    """
+    A generated Active Directory in an ldap3 mock server: users
+    spread over OUs, flat groups, one large group and a chain of
+    nested groups. Every connection made to the server (MOCK_SYNC
+    or MOCK_ASYNC) shares the same entries. With payload_bytes set,
+    every user has an info attribute of that size.
+
+    The mock does not maintain back-links or the distinguishedName
+    attribute, so memberOf is written here and objects that were
+    moved or renamed are not handed out again by take().
+    """
+
+    def __init__(self, users=10000, ous=10, groups=20, large_group_members=10000, nesting_depth=3, disabled_ratio=0.2, payload_bytes=0):
+        self.server = ldap3.Server("benchmark", get_info=ldap3.OFFLINE_AD_2012_R2)
+        self.connection = ldap3.Connection(self.server, user=ADMIN_DN, password=ADMIN_PASSWORD, client_strategy=ldap3.MOCK_SYNC)
+        self.users = users
+        self.ous = [f"OU=Bench{i},{ROOT_DN}" for i in range(ous)]
+        self.groups = [f"CN=bench_group{i},OU=Groups,{ROOT_DN}" for i in range(groups)]
+        self.large_group = f"CN=bench_large,OU=Groups,{ROOT_DN}"
+        self.nested_groups = [f"CN=bench_nested{i},OU=Groups,{ROOT_DN}" for i in range(nesting_depth)]
+        self.move_ous = [f"OU=BenchMoved{i},{ROOT_DN}" for i in range(2)]
+        self.disabled = set(range(0, users, round(1 / disabled_ratio))) if disabled_ratio else set()
+        self.payload_bytes = payload_bytes
+        self._usn = 0
+        self._next = {"enabled": 0, "disabled": 0}
+        self._populate(large_group_members)
+
+    def _add(self, dn, attributes):
+        self._usn += 1
+        attributes.setdefault("distinguishedName", dn)
+        attributes.setdefault("uSNCreated", self._usn)
+        attributes.setdefault("uSNChanged", self._usn)
+        self.connection.strategy.add_entry(dn, attributes)
+
+    def _populate(self, large_group_members):
+        self._add(f"CN=Users,{ROOT_DN}", {"objectClass": ["top", "container"], "cn": "Users"})
+        self._add(ADMIN_DN, {"objectClass": ["top", "person", "user"], "sAMAccountName": "admin", "userPassword": ADMIN_PASSWORD})
+        self._add(f"OU=Groups,{ROOT_DN}", {"objectClass": ["top", "organizationalUnit"], "ou": "Groups"})
+        for ou in self.ous + self.move_ous:
+            self._add(ou, {"objectClass": ["top", "organizationalUnit"], "ou": ou[3:].split(",")[0]})
+
+        member_of = {i: [] for i in range(self.users)}
+        large_members = range(min(large_group_members, self.users))
+        for i in large_members:
+            member_of[i].append(self.large_group)
+        for n in range(len(self.groups)):
+            for i in range(n, self.users, max(len(self.groups), 1) * 10):
+                member_of[i].append(self.groups[n])
+        if self.nested_groups:
+            for i in range(min(10, self.users)):
+                member_of[i].append(self.nested_groups[0])
+
+        for i in range(self.users):
+            self._add(
+                self.user_dn(i),
+                {
+                    "objectClass": ["top", "person", "organizationalPerson", "user"],
+                    "cn": f"bench{i}",
+                    "sAMAccountName": self.sam(i),
+                    "userPrincipalName": f"{self.sam(i)}@ad2012.lab",
+                    "objectSid": f"S-1-5-21-1004336348-1177238915-682003330-{1000 + i}",
+                    "mail": f"{self.sam(i)}@ad2012.lab",
+                    "description": f"Benchmark user {i}",
+                    "userAccountControl": 514 if i in self.disabled else 512,
+                    "lockoutTime": 0,
+                    "memberOf": member_of[i],
+                    **self._payload(i),
+                },
+            )
+
+        for n, group in enumerate(self.groups):
+            members = [self.user_dn(i) for i in range(n, self.users, max(len(self.groups), 1) * 10)]
+            self._add(group, {"objectClass": ["top", "group"], "sAMAccountName": f"bench_group{n}", "member": members})
+        # the mock removes values case-sensitively, and resolved sAMAccountNames come back lowercase
+        self._add(
+            self.large_group,
+            {"objectClass": ["top", "group"], "sAMAccountName": "bench_large", "member": [self.user_dn(i).lower() for i in large_members]},
+        )
+        for n, group in enumerate(self.nested_groups):
+            members = [self.user_dn(i) for i in range(min(10, self.users))] if n == 0 else [self.nested_groups[n - 1]]
+            parents = self.nested_groups[n + 1 : n + 2]
+            self._add(group, {"objectClass": ["top", "group"], "sAMAccountName": f"bench_nested{n}", "member": members, "memberOf": parents})
+
+    def _payload(self, i):
+        # a large info attribute with one NUL character, so the results also go through the NUL escaping
+        if not self.payload_bytes:
+            return {}
+        prefix = f"bench{i}\x00"
+        return {"info": prefix + "x" * max(0, self.payload_bytes - len(prefix))}
+
+    def sam(self, i):
+        return f"bench{i}"
+
+    def user_dn(self, i):
+        return f"CN=bench{i},{self.ous[i % len(self.ous)]}"
+
+    def take(self, count, disabled=False):
+        """
+        returns the indexes of count users that no earlier call
+        returned, enabled ones or (with disabled set) disabled ones.
+        Write benchmarks take their targets from here, so no object
+        is written twice.
+        """
+        pool = "disabled" if disabled else "enabled"
+        taken = []
+        i = self._next[pool]
+        while len(taken) < count and i < self.users:
+            if (i in self.disabled) == disabled:
+                taken.append(i)
+            i += 1
+        self._next[pool] = i
+        if len(taken) < count:
+            raise RuntimeError(f"Out of {pool} users, generate a larger directory with --users")
+        return taken
@@ -0,0 +1,524 @@
+# File: run_benchmarks.py
+#
+# Copyright (c) 2021-2025 Splunk Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions
+# and limitations under the License.
+"""
+Offline benchmarks of the connector's actions against a generated
+directory in an ldap3 mock server, with a stubbed phantom runtime.
+No network or SOAR instance is needed:
+
+    python benchmarks/run_benchmarks.py --users 20000 --iterations 10
+    python benchmarks/run_benchmarks.py --actions run_query,get_attributes --json before.json
+
+Each action runs --iterations times on a fresh state file (or on
+the state the previous run left with --warm) and then once more
+under tracemalloc for its peak memory. The mock scans every entry
+for each search, so the numbers are for comparing revisions with
+each other, not for predicting latencies against a real DC.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARK_DIR, "stubs"), os.path.dirname(BENCHMARK_DIR), BENCHMARK_DIR]
+
+import ldap3
+import phantom.app as phantom
+import phantom.rules as ph_rules
+from directory import ADMIN_DN, ADMIN_PASSWORD, Directory
+from ldap3.operation.search import MATCH_EQUAL, OR
+from ldap3.protocol.controls import build_control
+from ldap3.strategy.mockAsync import MockAsyncStrategy
+from ldap3.strategy.mockBase import MockBaseStrategy
+from ldap3.strategy.mockSync import MockSyncStrategy
+from ldap3.utils.conv import ldap_escape_to_bytes, to_unicode
+from phantom.action_result import ActionResult
+from phantom.base_connector import BaseConnector
+from phantom.vault import Vault
+
+import adldap_connector
+
+
+SCENARIOS = {}
+
+
+def scenario(action_id, run=None):
+    """
+    registers a function(directory, options, iteration) that
+    returns (param, number of objects processed) for one run
+    of the action. Benchmarks of something that is not an
+    action pass run, a function(connector, param) that is
+    called instead of handle_action and returns its status.
+    """
+
+    def decorator(function):
+        SCENARIOS[action_id] = (function, run)
+        return function
+
+    return decorator
+
+
+def write_vault_file(name, lines):
+    with open(os.path.join(ph_rules.vault_dir, name), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return name
+
+
+def sams(directory, indexes):
+    return ";".join(directory.sam(i) for i in indexes)
+
+
+@scenario("test_connectivity")
+def test_connectivity(directory, options, iteration):
+    return {}, 1
+
+
+@scenario("run_query")
+def run_query(directory, options, iteration):
+    return {"filter": "(objectClass=user)", "attributes": "cn;samaccountname;mail;description;memberof"}, directory.users
+
+
+def run_as_run_query(connector, param):
+    connector.set_action("run_query")
+    return connector.handle_action(param)
+
+
+@scenario("run_query_payload", run=run_as_run_query)
+def run_query_payload(directory, options, iteration):
+    # run query over --payload-bytes large info attributes, for the peak memory and CPU time of building the action data
+    return {"filter": "(objectClass=user)", "attributes": "cn;samaccountname;info"}, directory.users
+
+
+def export_and_check(connector, param):
+    # fails the run unless the file, the total and the inline sample agree
+    ret_val = run_as_run_query(connector, param)
+    action_result = connector.get_action_results()[-1]
+    if not ret_val:
+        return ret_val
+    summary = action_result.get_summary()
+    with gzip.open(os.path.join(ph_rules.vault_dir, summary["vault_id"]), "rt") as f:
+        lines = [json.loads(line) for line in f]
+    sample = action_result.get_data()[0]["entries"]
+    if len(lines) != summary["total_objects"] or lines[: len(sample)] != sample:
+        return action_result.set_status(
+            phantom.APP_ERROR, f"{len(lines)} lines were exported for {summary['total_objects']} objects, or the sample differs from them"
+        )
+    return ret_val
+
+
+@scenario("run_query_export", run=export_and_check)
+def run_query_export(directory, options, iteration):
+    # the members of the large group come in ranges, which are streamed into the file
+    groups = len(directory.groups) + 1 + len(directory.nested_groups)
+    return {"filter": "(objectClass=group)", "attributes": "cn;member", "output_mode": "jsonl", "max_results": groups}, groups
+
+
+@scenario("get_attributes")
+def get_attributes(directory, options, iteration):
+    indexes = range(iteration * options.batch, (iteration + 1) * options.batch)
+    principals = ";".join(directory.sam(i % directory.users) for i in indexes)
+    return {"principals": principals, "attributes": "cn;mail;memberof;useraccountcontrol"}, options.batch
+
+
+@scenario("get_effective_membership")
+def get_effective_membership(directory, options, iteration):
+    return {"principal": directory.sam(0)}, 1
+
+
+@scenario("get_changes")
+def get_changes(directory, options, iteration):
+    return {"filter": "(objectClass=user)", "attributes": "cn;samaccountname"}, directory.users
+
+
+@scenario("add_group_members")
+def add_group_members(directory, options, iteration):
+    group = directory.groups[iteration % len(directory.groups)]
+    return {
+        "members": sams(directory, directory.take(options.batch)),
+        "groups": group.split(",")[0][3:],
+        "use_samaccountname": True,
+    }, options.batch
+
+
+@scenario("remove_group_members")
+def remove_group_members(directory, options, iteration):
+    # the first users are in the large group
+    members = sams(directory, range(iteration * options.batch, (iteration + 1) * options.batch))
+    return {"members": members, "groups": "bench_large", "use_samaccountname": True}, options.batch
+
+
+@scenario("unlock_account")
+def unlock_account(directory, options, iteration):
+    return {"user": sams(directory, directory.take(options.batch)), "use_samaccountname": True}, options.batch
+
+
+@scenario("disable_account")
+def disable_account(directory, options, iteration):
+    return {"user": sams(directory, directory.take(options.batch)), "use_samaccountname": True}, options.batch
+
+
+@scenario("enable_account")
+def enable_account(directory, options, iteration):
+    return {"user": sams(directory, directory.take(options.batch, disabled=True)), "use_samaccountname": True}, options.batch
+
+
+@scenario("set_account_flag")
+def set_account_flag(directory, options, iteration):
+    users = sams(directory, directory.take(options.batch))
+    return {"user": users, "flag": "DONT_EXPIRE_PASSWORD", "state": "SET", "use_samaccountname": True}, options.batch
+
+
+@scenario("reset_password")
+def reset_password(directory, options, iteration):
+    users = [directory.sam(i) for i in directory.take(options.batch)]
+    vault_id = write_vault_file(f"reset_{iteration}.csv", ["user", *users])
+    return {"vault_id": vault_id, "use_samaccountname": True}, options.batch
+
+
+@scenario("set_password")
+def set_password(directory, options, iteration):
+    rows = [json.dumps({"user": directory.sam(i), "password": f"Benchmark-{i}!"}) for i in directory.take(options.batch)]
+    vault_id = write_vault_file(f"set_{iteration}.jsonl", rows)
+    return {"vault_id": vault_id, "use_samaccountname": True}, options.batch
+
+
+@scenario("move_object")
+def move_object(directory, options, iteration):
+    objects = sams(directory, directory.take(options.batch))
+    return {"object": objects, "destination_ou": directory.move_ous[iteration % 2], "use_samaccountname": True}, options.batch
+
+
+@scenario("rename_object")
+def rename_object(directory, options, iteration):
+    indexes = directory.take(options.batch)
+    new_names = ";".join(f"CN=renamed{i}" for i in indexes)
+    return {"object": sams(directory, indexes), "new_name": new_names, "use_samaccountname": True}, options.batch
+
+
+@scenario("set_attribute")
+def set_attribute(directory, options, iteration):
+    user = directory.sam(directory.take(1)[0])
+    return {"user": user, "attribute": "description", "value": f"run {iteration}", "action": "REPLACE", "use_samaccountname": True}, 1
+
+
+@scenario("set_attributes")
+def set_attributes(directory, options, iteration):
+    changes = {directory.sam(i): {"description": f"run {iteration}", "title": "Benchmark"} for i in directory.take(options.batch)}
+    return {"changes": json.dumps(changes), "use_samaccountname": True}, options.batch
+
+
+def resolve_names(connector, param):
+    action_result = connector.add_action_result(ActionResult(dict(param)))
+    if not connector._ldap_bind(action_result):
+        return action_result.get_status()
+    ret_val, dns = connector._sam_to_dn(param["names"], action_result)
+    if ret_val and not all(dns.values()):
+        return action_result.set_status(phantom.APP_ERROR, f"{sum(not dn for dn in dns.values())} names were not resolved")
+    return ret_val
+
+
+@scenario("sam_to_dn", run=resolve_names)
+def sam_to_dn(directory, options, iteration):
+    # every account of the directory, the cache is cold unless --warm
+    return {"names": [directory.sam(i) for i in range(directory.users)]}, directory.users
+
+
+def index_equality_filters(attributes=("samaccountname", "distinguishedname")):
+    """
+    the mock compares every candidate with every term of a filter,
+    so resolving thousands of names (or reading thousands of DNs)
+    in one (|(a=..)(a=..)) search is quadratic. An OR of equality terms on one of the given
+    attributes is answered from an index of the directory instead,
+    which is dropped whenever the mock writes, so the resolver is
+    measured rather than the mock.
+    """
+    evaluate_filter_node = MockBaseStrategy.evaluate_filter_node
+    indexes = {}
+
+    def get_index(dit, attribute):
+        if attribute not in indexes:
+            index = indexes[attribute] = {}
+            for dn, entry in dit.items():
+                for value in entry.get(attribute, []):
+                    index.setdefault(to_unicode(value).lower(), set()).add(dn)
+        return indexes[attribute]
+
+    def indexed_evaluate_filter_node(self, node, candidates):
+        terms = node.elements if node.tag == OR else []
+        if not terms or any(term.tag != MATCH_EQUAL or term.assertion["attr"].lower() not in attributes for term in terms):
+            return evaluate_filter_node(self, node, candidates)
+
+        # an OR is never the root node, so like the mock only the matched and unmatched sets are set
+        node.matched = set()
+        for term in terms:
+            index = get_index(self.connection.server.dit, term.assertion["attr"].lower())
+            node.matched.update(index.get(to_unicode(ldap_escape_to_bytes(term.assertion["value"])).lower(), ()))
+        node.unmatched = set(candidates)
+        node.matched.intersection_update(node.unmatched)
+        node.unmatched.difference_update(node.matched)
+
+    def invalidating(write):
+        def wrapper(self, *args, **kwargs):
+            indexes.clear()
+            return write(self, *args, **kwargs)
+
+        return wrapper
+
+    MockBaseStrategy.evaluate_filter_node = indexed_evaluate_filter_node
+    for name in ("add_entry", "mock_add", "mock_delete", "mock_modify", "mock_modify_dn"):
+        setattr(MockBaseStrategy, name, invalidating(getattr(MockBaseStrategy, name)))
+
+
+def emulate_max_val_range(limit=1500):
+    """
+    returns large multi-valued attributes in ";range=low-high"
+    chunks of limit values, like a domain controller's MaxValRange,
+    and answers requests for "attribute;range=low-*" with the next
+    chunk. The mock returns all values at once otherwise.
+    """
+    execute_search = MockBaseStrategy._execute_search
+
+    def ranged_execute_search(self, request):
+        ranges = {}
+        for attribute in request["attributes"]:
+            name, _, value_range = str(attribute).partition(";range=")
+            if value_range:
+                ranges[name.lower()] = int(value_range.partition("-")[0])
+        if ranges:
+            request = dict(request, attributes=[str(attribute).partition(";range=")[0] for attribute in request["attributes"]])
+
+        responses, result = execute_search(self, request)
+        for response in responses:
+            for attribute in response["attributes"]:
+                low = ranges.get(attribute["type"].lower())
+                if low is None and len(attribute["vals"]) <= limit:
+                    continue
+                low = low or 0
+                high = "*" if low + limit >= len(attribute["vals"]) else low + limit - 1
+                attribute["type"] = f"{attribute['type']};range={low}-{high}"
+                attribute["vals"] = attribute["vals"][low : low + limit]
+        return responses, result
+
+    MockBaseStrategy._execute_search = ranged_execute_search
+
+
+def inject_latency(seconds):
+    """
+    adds a network round trip to every mock request. A MOCK_SYNC
+    request waits for it before it is answered. A MOCK_ASYNC
+    response only becomes available a round trip after its request
+    was sent, so requests kept in flight together wait together.
+    """
+    for name in ("post_send_search", "post_send_single_response"):
+        sync_send = getattr(MockSyncStrategy, name)
+        async_send = getattr(MockAsyncStrategy, name)
+
+        def send_sync(self, payload, send=sync_send):
+            time.sleep(seconds)
+            return send(self, payload)
+
+        def send_async(self, payload, send=async_send):
+            message_id = send(self, payload)
+            sent[(id(self), message_id)] = time.perf_counter()
+            return message_id
+
+        setattr(MockSyncStrategy, name, send_sync)
+        setattr(MockAsyncStrategy, name, send_async)
+
+    sent = {}
+    get_response = MockAsyncStrategy.get_response
+
+    def get_response_after_round_trip(self, message_id, *args, **kwargs):
+        sent_at = sent.pop((id(self), message_id), None)
+        if sent_at is not None:
+            time.sleep(max(0, sent_at + seconds - time.perf_counter()))
+        return get_response(self, message_id, *args, **kwargs)
+
+    MockAsyncStrategy.get_response = get_response_after_round_trip
+
+
+def patch_ldap3(directory):
+    """
+    points the connector at the mock server: every Server is the
+    generated one, every Connection is a mock one bound as the
+    benchmark admin, ASYNC ones use MOCK_ASYNC.
+    """
+    real_connection = ldap3.Connection
+
+    def server(*args, **kwargs):
+        return directory.server
+
+    def connection(server, *args, **kwargs):
+        strategy = ldap3.MOCK_ASYNC if kwargs.pop("client_strategy", None) == ldap3.ASYNC else ldap3.MOCK_SYNC
+        kwargs.update(user=ADMIN_DN, password=ADMIN_PASSWORD, client_strategy=strategy)
+        return real_connection(directory.server, **kwargs)
+
+    adldap_connector.ldap3.Server = server
+    adldap_connector.ldap3.Connection = connection
+
+    # the mock has no highestCommittedUSN in its root DSE and cannot encode a control without a value
+    usn = iter(range(10**9, 2 * 10**9))
+    adldap_connector.AdLdapConnector._get_highest_committed_usn = lambda self: next(usn)
+    adldap_connector.show_deleted_control = lambda: build_control("1.2.840.113556.1.4.417", False, b"", encode_control_value=False)
+    index_equality_filters()
+    emulate_max_val_range()
+
+
+def run_action(action_id, param, run=None):
+    connector = adldap_connector.AdLdapConnector()
+    connector.set_action(action_id)
+    connector.initialize()
+    try:
+        ret_val = run(connector, param) if run else connector.handle_action(param)
+    finally:
+        connector.finalize()
+    action_result = connector.get_action_results()[-1]
+    return ret_val, action_result
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values) + 0.5) - 1))]
+
+
+def benchmark(directory, action_id, options):
+    state_file = os.path.join(BaseConnector.state_dir, "benchmark_state.json")
+    latencies = []
+    cpu_times = []
+    objects = 0
+    failures = []
+    for iteration in range(options.iterations + 1):
+        if not options.warm and os.path.exists(state_file):
+            os.remove(state_file)
+        function, run = SCENARIOS[action_id]
+        param, objects = function(directory, options, iteration)
+
+        # the last run only measures the peak memory, tracemalloc slows everything down
+        traced = iteration == options.iterations
+        if traced:
+            tracemalloc.start()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        ret_val, action_result = run_action(action_id, param, run)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            latencies.append(elapsed)
+            cpu_times.append(cpu)
+
+        if not ret_val:
+            failures.append(action_result.get_message())
+
+    median = statistics.median(latencies)
+    return {
+        "action": action_id,
+        "objects": objects,
+        "runs": options.iterations,
+        "failed_runs": len(failures),
+        "error": failures[0] if failures else None,
+        "p50_ms": round(median * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "cpu_ms": round(statistics.median(cpu_times) * 1000, 2),
+        "objects_per_s": round(objects / median, 1) if median else None,
+        "peak_mib": round(peak / 2**20, 2),
+    }
+
+
+def parse_config(values):
+    config = {}
+    for value in values:
+        key, _, value = value.partition("=")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="users in the generated directory (default 10000)")
+    parser.add_argument("--ous", type=int, default=10, help="OUs the users are spread over (default 10)")
+    parser.add_argument("--groups", type=int, default=20, help="flat groups (default 20)")
+    parser.add_argument("--large-group-members", type=int, default=10000, help="members of the large group (default 10000)")
+    parser.add_argument("--nesting-depth", type=int, default=3, help="length of the nested group chain (default 3)")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="size of an info attribute added to every user (default none)")
+    parser.add_argument("--batch", type=int, default=50, help="targets per run of the multi-target actions (default 50)")
+    parser.add_argument("--iterations", type=int, default=5, help="timed runs per action (default 5)")
+    parser.add_argument("--actions", help="comma separated action identifiers (default all)")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=VALUE", help="asset config override, e.g. max_concurrency=8")
+    parser.add_argument("--latency", type=float, default=0, metavar="MS", help="round trip time added to every LDAP request (default 0)")
+    parser.add_argument("--warm", action="store_true", help="keep the state file (and its caches) between runs")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to a JSON file")
+    options = parser.parse_args()
+
+    actions = options.actions.split(",") if options.actions else [a for a in SCENARIOS if a != "run_query_payload" or options.payload_bytes]
+    unknown = [action for action in actions if action not in SCENARIOS]
+    if unknown:
+        parser.error(f"no benchmark for {', '.join(unknown)}, known: {', '.join(SCENARIOS)}")
+    if "run_query_payload" in actions and not options.payload_bytes:
+        parser.error("run_query_payload needs --payload-bytes")
+
+    start = time.perf_counter()
+    directory = Directory(
+        users=options.users,
+        ous=options.ous,
+        groups=options.groups,
+        large_group_members=options.large_group_members,
+        nesting_depth=options.nesting_depth,
+        payload_bytes=options.payload_bytes,
+    )
+    print(f"Generated {options.users} users in {time.perf_counter() - start:.1f}s")
+    patch_ldap3(directory)
+    if options.latency:
+        inject_latency(options.latency / 1000)
+
+    work_dir = tempfile.mkdtemp(prefix="adldap_benchmark_")
+    try:
+        BaseConnector.state_dir = work_dir
+        BaseConnector.config = {"server": "benchmark", "username": "admin", "password": ADMIN_PASSWORD, "force_ssl": False, "ssl_port": 636}
+        BaseConnector.config.update(parse_config(options.config))
+        ph_rules.vault_dir = Vault.tmp_dir = os.path.join(work_dir, "vault")
+        os.mkdir(ph_rules.vault_dir)
+
+        results = []
+        columns = ("action", "objects", "p50_ms", "p95_ms", "max_ms", "cpu_ms", "objects_per_s", "peak_mib", "failed_runs")
+        print(" ".join(f"{c:>14}" if i else f"{c:<26}" for i, c in enumerate(columns)))
+        for action_id in actions:
+            result = benchmark(directory, action_id, options)
+            results.append(result)
+            print(" ".join(f"{result[c]!s:>14}" if i else f"{result[c]:<26}" for i, c in enumerate(columns)))
+            if result["error"]:
+                print(f"    {result['error']}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
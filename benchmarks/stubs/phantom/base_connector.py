@@ -0,0 +1,85 @@
+# File: base_connector.py
+#
+# Copyright (c) 2021-2025 Splunk Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions
+# and limitations under the License.
+import json
+import os
+
+
+class BaseConnector:
+    """
+    Keeps the config, state and action results in memory, the
+    state file and progress messages go to the given directory
+    and are discarded.
+    """
+
+    state_dir = None
+    config = {}
+
+    def __init__(self):
+        self._action_results = []
+        self._action = None
+
+    def set_action(self, action):
+        self._action = action
+
+    def add_action_result(self, action_result):
+        self._action_results.append(action_result)
+        return action_result
+
+    def get_action_results(self):
+        return self._action_results
+
+    def get_action_identifier(self):
+        return self._action
+
+    def get_config(self):
+        return self.config
+
+    def get_asset_id(self):
+        return "benchmark"
+
+    def get_app_id(self):
+        return "benchmark"
+
+    def get_app_json(self):
+        return {"app_version": "benchmark"}
+
+    def get_container_id(self):
+        return 1
+
+    def get_state_dir(self):
+        return self.state_dir
+
+    def load_state(self):
+        try:
+            with open(os.path.join(self.state_dir, "benchmark_state.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        with open(os.path.join(self.state_dir, "benchmark_state.json"), "w") as f:
+            json.dump(state, f)
+
+    def save_progress(self, *args, **kwargs):
+        pass
+
+    def send_progress(self, *args, **kwargs):
+        pass
+
+    def debug_print(self, *args, **kwargs):
+        pass
+
+    def error_print(self, *args, **kwargs):
+        pass
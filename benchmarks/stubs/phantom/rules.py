@@ -0,0 +1,32 @@
+# File: rules.py
+#
+# Copyright (c) 2021-2025 Splunk Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific language governing permissions
+# and limitations under the License.
+import os
+import shutil
+
+
+# files added to the vault are copied here, files to read from it are looked up by vault id
+vault_dir = None
+
+
+def vault_add(container=None, file_location=None, file_name=None, metadata=None, trace=False):
+    shutil.copy(file_location, os.path.join(vault_dir, file_name))
+    return True, "File added", file_name
+
+
+def vault_info(vault_id=None, container_id=None, file_name=None, trace=False):
+    path = os.path.join(vault_dir, vault_id)
+    if not os.path.exists(path):
+        return False, "File not found", []
+    return True, "File found", [{"path": path, "name": vault_id, "vault_id": vault_id}]